@@ -1,9 +1,17 @@
-from flask import Flask, render_template, request, send_from_directory
+from flask import Flask, abort, jsonify, redirect, render_template, request, send_from_directory, url_for
 from src.db.session import SessionLocal
-from src.db.models import Tweet
+from src.db.models import Tweet, normalize_username
+from src.db.fts import MARK_CLOSE, MARK_OPEN, fts_condition, fts_join_condition, fts_rank, fts_snippet, tweets_fts
+from src.db.threads import MAX_ANCESTORS, MAX_DEPTH, MAX_REPLIES, thread_query
+from src import derivatives
+import base64
 import datetime
+import json
+import re
 from pathlib import Path
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, literal, or_, tuple_
+from sqlalchemy.orm import selectinload
+from werkzeug.security import safe_join
 
 app = Flask(__name__)
 IMAGES_DIR = Path(__file__).parent.parent / "images"
@@ -14,7 +22,15 @@ from markupsafe import Markup, escape
 def nl2br_filter(s):
     if s is None:
         return ''
-    return Markup(escape(s).replace('\n', '<br>'))
+    # Markup.replace escapes plain-str arguments, so the tag must be Markup too
+    return escape(s).replace('\n', Markup('<br>'))
+
+@app.template_filter('highlight')
+def highlight_filter(snippet):
+    """Escape an FTS snippet and turn its match markers into <mark> tags."""
+    if not snippet:
+        return ''
+    return Markup(str(escape(snippet)).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>'))
 
 # Add basename filter
 @app.template_filter('basename')
@@ -27,39 +43,324 @@ def basename_filter(s):
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        start_date = request.form.get("start_date")
-        end_date = request.form.get("end_date")
-
-        try:
-            start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
-            end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
-        except Exception:
-            start_date = None
-            end_date = None
-
-        return search_results(username, start_date, end_date)
+        # Searches are GET /search so result pages (and their cursors) can be linked
+        params = {k: v.strip() for k, v in request.form.items() if v.strip()}
+        return redirect(url_for("search", **params), code=303)
     return render_template("index.html")
 
-def search_results(username, start_date, end_date):
-    session = SessionLocal()
-    query = session.query(Tweet)
+# Username matching modes; exact and prefix are range scans of ix_tweets_username_norm_created_at_id
+MATCH_MODES = ("exact", "prefix", "contains")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date() if value else None
+    except ValueError:
+        return None
 
-    if username:
-        query = query.filter(Tweet.username.ilike(f"%{username}%"))
+def parse_search_args(args):
+    """Search parameters from a query string (cursors and page size excluded)."""
+    match = args.get("match", "prefix")
+    return {
+        "username": args.get("username", "").strip(),
+        "match": match if match in MATCH_MODES else "prefix",
+        "q": args.get("q", "").strip(),
+        "start_date": parse_date(args.get("start_date")),
+        "end_date": parse_date(args.get("end_date")),
+    }
+
+def username_filter(username, match="prefix"):
+    """SQL condition matching Tweet.username_norm against a searched handle."""
+    key = normalize_username(username)
+    if match == "exact":
+        return Tweet.username_norm == key
+    if match == "contains":
+        # Full scan; kept for searching by a fragment from the middle of a handle
+        return Tweet.username_norm.contains(key, autoescape=True)
+    # prefix as a half-open range (LIKE 'x%' cannot use the index on a case-sensitive column)
+    upper = key[:-1] + chr(ord(key[-1]) + 1)
+    return (Tweet.username_norm >= key) & (Tweet.username_norm < upper)
+
+def build_search_query(session, username=None, start_date=None, end_date=None, match="prefix", q=None):
+    """(query, sort_keys) for the search form; rows are (Tweet, snippet, rank).
+
+    Without q the rows are newest first and snippet/rank are None. With q they are
+    joined to the tweets_fts full-text index, best bm25 match first, and snippet is the
+    matching fragment (for terms short enough to need the LIKE fallback: None, newest
+    first). sort_keys lists the (expression, descending) ordering used for paging.
+    """
+    condition, ranked = fts_condition(q) if q and q.strip() else (None, False)
+    snippet = fts_snippet() if ranked else literal(None)
+    rank = fts_rank() if ranked else literal(None)
+    # Tweets without a timestamp cannot be placed on the (created_at, tweet_id) keyset
+    query = session.query(Tweet, snippet.label("snippet"), rank.label("rank")).filter(Tweet.created_at.isnot(None))
+    if condition is not None:
+        query = query.join(tweets_fts, fts_join_condition(Tweet.tweet_id)).filter(condition)
+    if username and normalize_username(username):
+        query = query.filter(username_filter(username, match))
     if start_date:
         query = query.filter(Tweet.created_at >= datetime.datetime.combine(start_date, datetime.time.min))
     if end_date:
-        query = query.filter(Tweet.created_at <= datetime.datetime.combine(end_date, datetime.time.max))
+        next_day = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+        query = query.filter(Tweet.created_at < next_day)
+    sort_keys = [(Tweet.created_at, True), (Tweet.tweet_id, True)]
+    if ranked:
+        sort_keys.insert(0, (fts_rank(), False))
+    return query, sort_keys
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(token, size):
+    """Sort-key values of a cursor token, or None if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    # [rank,] created_at, tweet_id: a tampered value must not reach the SQL comparison
+    rank = values[:-2]
+    if not isinstance(values[-1], str) or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in rank):
+        return None
+    try:
+        values[-2] = datetime.datetime.fromisoformat(values[-2])
+    except (TypeError, ValueError):
+        return None
+    return values
+
+def keyset_condition(sort_keys, values, forward=True):
+    """Rows strictly after (forward) or before the cursor values in sort_keys order."""
+    if len({descending for _, descending in sort_keys}) == 1:
+        # One direction: a row-value comparison, which SQLite turns into an index range
+        keys = tuple_(*[expr for expr, _ in sort_keys])
+        return keys < tuple_(*values) if sort_keys[0][1] == forward else keys > tuple_(*values)
+    clauses = []
+    for i, (expr, descending) in enumerate(sort_keys):
+        after = (expr < values[i]) if descending == forward else (expr > values[i])
+        clauses.append(and_(*[e == v for (e, _), v in zip(sort_keys[:i], values[:i])], after))
+    return or_(*clauses)
+
+def paginate(query, sort_keys, after=None, before=None, page_size=PAGE_SIZE):
+    """Fetch one keyset page of (Tweet, snippet, rank) rows.
+
+    after/before are cursor tokens from a previous page. Returns (rows, next, prev):
+    next/prev are cursors for the following and preceding pages, or None at either end.
+    Each page costs one LIMIT page_size + 1 query, however deep it is.
+    """
+    values = decode_cursor(after or before or "", len(sort_keys)) if (after or before) else None
+    backward = values is not None and not after
+    if values is not None:
+        query = query.filter(keyset_condition(sort_keys, values, forward=not backward))
+    order = [expr.desc() if descending != backward else expr.asc() for expr, descending in sort_keys]
+    rows = query.order_by(*order).limit(page_size + 1).all()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backward:
+        rows.reverse()
+
+    def cursor(row):
+        tweet, _, rank = row
+        return encode_cursor(([rank] if len(sort_keys) == 3 else []) + [tweet.created_at, tweet.tweet_id])
+
+    has_next = more if not backward else values is not None
+    has_prev = values is not None if not backward else more
+    next_cursor = cursor(rows[-1]) if rows and has_next else None
+    prev_cursor = cursor(rows[0]) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
+def image_filename(path):
+    """Path of a stored image relative to IMAGES_DIR, as served by the /images route."""
+    parts = Path(path).parts
+    return "/".join(parts[1:] if parts and parts[0] == IMAGES_DIR.name else parts)
+
+def prepare_for_display(tweet):
+    """Precompute what the templates read, so rendering never touches the (closed) session."""
+    tweet.image_files = [image_filename(p) for p in tweet.images()]
+    return tweet
 
-    tweets = query.options(joinedload(Tweet.quoted_tweet)).order_by(Tweet.created_at.desc()).all()
-    session.close()
+# Everything results.html and tweet_json() read, loaded up front: three queries per page
+# (the page, its quoted tweets, its reply parents) whatever the page size
+RESULT_LOAD_OPTIONS = (
+    selectinload(Tweet.quoted_tweet),
+    selectinload(Tweet.in_reply_to_tweet),
+)
 
-    return render_template("results.html", tweets=tweets, images_dir=str(IMAGES_DIR))
+def search_page(args):
+    """Run the search described by a query string; returns (params, tweets, next, prev)."""
+    params = parse_search_args(args)
+    try:
+        page_size = min(MAX_PAGE_SIZE, max(1, int(args.get("page_size", PAGE_SIZE))))
+    except ValueError:
+        page_size = PAGE_SIZE
+    session = SessionLocal()
+    try:
+        query, sort_keys = build_search_query(session, **params)
+        query = query.options(*RESULT_LOAD_OPTIONS)
+        rows, next_cursor, prev_cursor = paginate(query, sort_keys, args.get("after"), args.get("before"), page_size)
+        tweets = []
+        for tweet, snippet, _ in rows:
+            tweet.snippet = snippet
+            for related in (tweet.quoted_tweet, tweet.in_reply_to_tweet):
+                if related is not None:
+                    prepare_for_display(related)
+            tweets.append(prepare_for_display(tweet))
+    finally:
+        session.close()
+    if page_size != PAGE_SIZE:
+        params["page_size"] = page_size
+    return params, tweets, next_cursor, prev_cursor
+
+def query_params(params):
+    """Search params as query-string values (dates formatted, empty values dropped)."""
+    return {k: v.isoformat() if isinstance(v, datetime.date) else v for k, v in params.items() if v}
+
+@app.route("/search")
+def search():
+    params, tweets, next_cursor, prev_cursor = search_page(request.args)
+    return render_template("results.html", tweets=tweets, images_dir=str(IMAGES_DIR), q=params["q"],
+                           params=query_params(params), next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+def tweet_json(tweet):
+    return {
+        "tweet_id": tweet.tweet_id,
+        "user_id": tweet.user_id,
+        "username": tweet.username,
+        "text": tweet.text,
+        "created_at": tweet.created_at.isoformat() if tweet.created_at else None,
+        "in_reply_to_tweet_id": tweet.in_reply_to_tweet_id,
+        "quoted_tweet_id": tweet.quoted_tweet_id,
+        "images": tweet.image_files,
+        "snippet": str(highlight_filter(getattr(tweet, "snippet", None))) or None,
+    }
+
+def limit_arg(args, name, default):
+    try:
+        return min(default, max(0, int(args.get(name, default))))
+    except ValueError:
+        return default
+
+def thread_page(tweet_id, args):
+    """The conversation around tweet_id as (tweets, more_replies), or None if it is not stored.
+
+    Each tweet gets .depth (negative for ancestors, 0 for tweet_id, positive for replies).
+    Two queries whatever the thread's size: the recursive thread query and its quoted tweets.
+    up/down/limit in args lower the ancestor, reply depth and reply count limits.
+    """
+    limits = {
+        "max_ancestors": limit_arg(args, "up", MAX_ANCESTORS),
+        "max_depth": limit_arg(args, "down", MAX_DEPTH),
+        "max_replies": limit_arg(args, "limit", MAX_REPLIES),
+    }
+    session = SessionLocal()
+    try:
+        rows = thread_query(session, tweet_id, **limits).options(selectinload(Tweet.quoted_tweet)).all()
+        if not any(depth == 0 for _, depth, _ in rows):
+            return None
+        replies = [row for row in rows if row[1] > 0]
+        more_replies = len(replies) > limits["max_replies"]
+        if more_replies:
+            # The query keeps one reply too many, shallowest first; drop the last of those
+            rows.remove(max(replies, key=lambda row: (row[1], row[2])))
+        tweets = []
+        for tweet, depth, _ in rows:
+            tweet.depth = depth
+            if tweet.quoted_tweet is not None:
+                prepare_for_display(tweet.quoted_tweet)
+            tweets.append(prepare_for_display(tweet))
+    finally:
+        session.close()
+    return tweets, more_replies
+
+@app.route("/thread/<tweet_id>")
+def thread(tweet_id):
+    page = thread_page(tweet_id, request.args)
+    if page is None:
+        abort(404)
+    tweets, more_replies = page
+    return render_template("thread.html", tweets=tweets, tweet_id=tweet_id, more_replies=more_replies)
+
+@app.route("/thread/<tweet_id>.json")
+def thread_json(tweet_id):
+    page = thread_page(tweet_id, request.args)
+    if page is None:
+        return jsonify({"error": f"Tweet {tweet_id} is not stored"}), 404
+    tweets, more_replies = page
+    return jsonify({
+        "tweets": [dict(tweet_json(t), depth=t.depth) for t in tweets],
+        "more_replies": more_replies,
+    })
+
+@app.route("/search.json")
+def search_json():
+    params, tweets, next_cursor, prev_cursor = search_page(request.args)
+    params = query_params(params)
+    return jsonify({
+        "tweets": [tweet_json(t) for t in tweets],
+        "next": url_for("search_json", **params, after=next_cursor) if next_cursor else None,
+        "prev": url_for("search_json", **params, before=prev_cursor) if prev_cursor else None,
+    })
+
+# Stored images are write-once: content-addressed files are named after their sha256,
+# and the older per-tweet files got unique names, so browsers may cache them forever
+IMAGE_MAX_AGE = 365 * 24 * 3600
+CONTENT_ADDRESSED_NAME = re.compile(r"[0-9a-f]{64}")
+
+# A ?w= request answered with the original (no Pillow, undecodable image) may get a
+# resized copy later, so that answer is cached briefly and not as immutable
+FALLBACK_MAX_AGE = 300
+
+# Thumbnail widths offered to the results page; tweet images are displayed at most 140px wide
+SRCSET_WIDTHS = (320, 640)
+
+@app.template_global()
+def image_srcset(filename):
+    return ", ".join(f"{url_for('images', filename=filename, w=w)} {w}w" for w in SRCSET_WIDTHS)
+
+def serve_derivative(filename, width):
+    """Response with a resized copy of a stored image in the best format the client accepts, or None."""
+    source = safe_join(str(IMAGES_DIR), filename)
+    if source is None or not Path(source).is_file():
+        return None
+    path = derivatives.ensure_derivative(Path(source), width,
+                                         derivatives.negotiate_format(request.headers.get("Accept")))
+    if path is None:
+        return None
+    # Derivatives are content-keyed too; the format depends on Accept, so caches must vary on it
+    response = send_from_directory(path.parent, path.name, etag=path.name, max_age=IMAGE_MAX_AGE)
+    response.vary.add("Accept")
+    return response
 
 @app.route("/images/<path:filename>")
 def images(filename):
-    return send_from_directory(IMAGES_DIR, filename)
+    """Serve a stored image with immutable caching, a strong ETag, 304s and Range support.
+
+    ?w=<width> asks for a resized WebP/AVIF/JPEG copy instead (see src/derivatives.py);
+    the original is served when Pillow is unavailable or the image cannot be decoded,
+    with FALLBACK_MAX_AGE caching only.
+    """
+    width = request.args.get("w", type=int)
+    resized = width is not None and width > 0
+    response = serve_derivative(filename, width) if resized else None
+    if response is not None:
+        response.cache_control.immutable = True
+    else:
+        stem = Path(filename).stem
+        # The sha256 in the name is the ideal strong validator; other files get Werkzeug's
+        # mtime/size ETag. send_file answers If-None-Match with 304 and Range with 206.
+        etag = stem if CONTENT_ADDRESSED_NAME.fullmatch(stem) else True
+        response = send_from_directory(IMAGES_DIR, filename, etag=etag,
+                                       max_age=FALLBACK_MAX_AGE if resized else IMAGE_MAX_AGE)
+        if resized:
+            # What this URL serves once a derivative exists depends on Accept
+            response.vary.add("Accept")
+        else:
+            response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Repeat-page-view benchmark for the /images route, dispatched in-process through the app.
+
+    python -m src.benchmark_images [--images 200] [--size 150000]
+
+Writes --images random files of --size bytes under content-addressed names into a
+scratch IMAGES_DIR, then "views a results page" twice with a browser-like cache that
+honours Cache-Control max-age and revalidates stale entries with If-None-Match.
+The current route is compared with a plain send_from_directory() route without
+caching headers (the previous behaviour).
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from flask import send_from_directory
+
+import src.app as web
+
+def legacy_images(filename):
+    return send_from_directory(web.IMAGES_DIR, filename)
+
+def dispatch(url, headers):
+    """GET url through the app in-process (Flask 2.3's test client breaks on Werkzeug 3)."""
+    with web.app.test_request_context(url, headers=headers):
+        response = web.app.full_dispatch_request()
+        response.direct_passthrough = False
+        response.get_data()  # read file responses while the request is open
+        return response
+
+class BrowserCache:
+    """Just enough of a browser HTTP cache: freshness from max-age, ETag revalidation."""
+
+    def __init__(self, get=dispatch):
+        self.get = get
+        self.entries = {}  # url -> (etag, fresh_until)
+
+    def fetch(self, url):
+        """Return (requests sent, body bytes received, seconds spent)."""
+        etag, fresh_until = self.entries.get(url, (None, 0.0))
+        if time.monotonic() < fresh_until:
+            return 0, 0, 0.0
+        headers = {"If-None-Match": etag} if etag else {}
+        started = time.perf_counter()
+        response = self.get(url, headers)
+        body = response.get_data()
+        elapsed = time.perf_counter() - started
+        max_age = response.cache_control.max_age or 0
+        self.entries[url] = (response.get_etag()[0] or etag, time.monotonic() + max_age)
+        return 1, len(body), elapsed
+
+def view_page(cache, urls):
+    totals = [0, 0, 0.0]
+    for url in urls:
+        for i, value in enumerate(cache.fetch(url)):
+            totals[i] += value
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="/images repeat-view benchmark")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", type=int, default=150_000, help="Bytes per image")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        web.IMAGES_DIR = Path(tmp)
+        filenames = []
+        for _ in range(args.images):
+            content = os.urandom(args.size)
+            sha = hashlib.sha256(content).hexdigest()
+            path = web.IMAGES_DIR / sha[:2] / sha[2:4] / f"{sha}.jpg"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+            filenames.append(f"{sha[:2]}/{sha[2:4]}/{sha}.jpg")
+        web.app.add_url_rule("/legacy-images/<path:filename>", "legacy_images", legacy_images)
+
+        for label, prefix in (("legacy", "/legacy-images/"), ("current", "/images/")):
+            cache = BrowserCache()
+            urls = [prefix + name for name in filenames]
+            for view in ("first view", "repeat view"):
+                requests, size, seconds = view_page(cache, urls)
+                print(f"{label:>8} {view:<12}: {requests:4d} requests  {size / 1024:9.1f} KiB  "
+                      f"{seconds * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
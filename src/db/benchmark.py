@@ -0,0 +1,138 @@
+"""Concurrent scrape-write + web-read benchmark for the SQLite configuration.
+
+    python -m src.db.benchmark [--seconds 10] [--writers 4] [--readers 4] [--seed 20000]
+
+Runs the same workload against a scratch database twice:
+- baseline: a plain create_engine() with per-tweet store_tweet() commits from every
+  writer thread (the pre-WAL setup);
+- tuned: session.make_engine() (WAL + pragmas) with TweetWriter batches funnelled
+  through the shared writer thread.
+Readers run the web app's search query (username ILIKE, date-ordered, quoted tweets
+joined) in a loop. Reports write and read throughput, read latency and lock errors.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from src.db.crud import TweetWriter, store_tweet
+from src.db.models import Base, Tweet
+from src.db.session import make_engine, write_queue_for
+
+USERNAMES = ["alice", "bob", "carol", "dave", "erin"]
+
+def fake_tweet(n):
+    return {
+        "tweet_id": str(1_700_000_000_000_000_000 + n),
+        "user_id": str(n % len(USERNAMES)),
+        "username": USERNAMES[n % len(USERNAMES)],
+        "text": f"benchmark tweet {n} " + "lorem ipsum " * 10,
+        "created_at": datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=n),
+        "image_paths": "",
+    }
+
+def seed(engine, count):
+    with engine.begin() as conn:
+        conn.execute(Tweet.__table__.insert(), [fake_tweet(n) for n in range(count)])
+
+def run_workload(engine, batched, seconds, writers, readers, first_id):
+    Session = sessionmaker(bind=engine, autoflush=False)
+    ids = itertools.count(first_id)
+    stop = threading.Event()
+    stats = {"writes": 0, "reads": 0, "lock_errors": 0, "latencies": []}
+    lock = threading.Lock()
+
+    def count(key, value=1):
+        with lock:
+            stats[key] += value
+
+    def writer():
+        session = Session()
+        tweet_writer = TweetWriter(session, batch_size=50, flush_interval=1.0) if batched else None
+        try:
+            while not stop.is_set():
+                tweet_data = fake_tweet(next(ids))
+                try:
+                    if batched:
+                        tweet_writer.add(tweet_data)
+                    else:
+                        store_tweet(tweet_data, session, scraper_fn=None)
+                    count("writes")
+                except OperationalError:
+                    session.rollback()
+                    count("lock_errors")
+            if batched:
+                tweet_writer.close()
+        finally:
+            session.close()
+
+    def reader():
+        while not stop.is_set():
+            session = Session()
+            started = time.monotonic()
+            try:
+                (session.query(Tweet)
+                 .filter(Tweet.username.ilike("%ali%"))
+                 .options(joinedload(Tweet.quoted_tweet))
+                 .order_by(Tweet.created_at.desc())
+                 .limit(200).all())
+                count("reads")
+                with lock:
+                    stats["latencies"].append(time.monotonic() - started)
+            except OperationalError:
+                count("lock_errors")
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    if batched:
+        write_queue_for(engine).close()
+    return stats
+
+def report(label, stats, seconds):
+    latencies = sorted(stats["latencies"]) or [0.0]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{label:>8}: {stats['writes'] / seconds:8.1f} writes/s  {stats['reads'] / seconds:7.1f} reads/s  "
+          f"read p95 {p95 * 1000:7.1f}ms  lock errors {stats['lock_errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrent write/read benchmark")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=20000, help="Tweets in the database before the run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, batched in (("baseline", False), ("tuned", True)):
+            db_url = f"sqlite:///{Path(tmp) / f'{label}.db'}"
+            if batched:
+                engine = make_engine(db_url)
+            else:
+                engine = create_engine(db_url, connect_args={"check_same_thread": False})
+                Base.metadata.create_all(engine)
+            seed(engine, args.seed)
+            # store_tweet/TweetWriter log every write; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = run_workload(engine, batched, args.seconds, args.writers, args.readers, args.seed)
+            report(label, stats, args.seconds)
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,145 @@
 import os
-import requests
+import time
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
+from src.db.known import KnownTweetIndex
 from src.db.models import Tweet
+from src.db.session import write_queue_for
 
-IMAGES_DIR = 'images'  # local folder to save images
-os.makedirs(IMAGES_DIR, exist_ok=True)
-
-def save_image_locally(image_url: str, tweet_id: str) -> str:
+def save_image_locally(image_url: str, tweet_id: str, media=None) -> str:
+    """
+    Downloads the image from image_url into the shared content-addressed media store
+    through media (a MediaPipeline, e.g. src.scraper.media.MEDIA).
+    Returns the local file path (shared by every tweet referencing the same media).
     """
-    Downloads the image from image_url and saves it locally.
-    Returns the local file path.
+    if not image_url.startswith(("http://", "https://")):
+        # Already a local path (the scraper downloads images itself)
+        return image_url if os.path.exists(image_url) else None
+    if media is None:
+        print(f"No media pipeline to download image {image_url}")
+        return None
+    # Known URLs resolve from the media index without being fetched again
+    local_path = media.submit(image_url, fallback=False).result()
+    if not local_path:
+        print(f"Failed to download image {image_url}")
+        return None
+    return local_path
+
+def tweet_row(tweet_data: dict) -> dict:
+    """Column values of the tweets row for a tweet_data dict (see store_tweet)."""
+    return {
+        "tweet_id": tweet_data['tweet_id'],
+        "user_id": tweet_data['user_id'],
+        "username": tweet_data['username'],
+        "text": tweet_data.get('text', ''),
+        "created_at": tweet_data['created_at'],
+        "in_reply_to_tweet_id": tweet_data.get('in_reply_to_tweet_id'),
+        "quoted_tweet_id": tweet_data.get('quoted_tweet_id'),
+        "image_paths": tweet_data.get('image_paths', ''),
+        "video_username": tweet_data['username'] if tweet_data.get('has_video') else None,
+    }
+
+class TweetWriter:
+    """Batched unit-of-work writer for scraped tweets.
+
+    add() buffers tweet_data dicts (with local image_paths already set). A flush checks
+    the whole batch against the DB with one IN query, inserts the new rows with a single
+    executemany INSERT ... ON CONFLICT DO NOTHING and commits once, on the database's
+    shared writer thread (see session.WriteQueue). Batches flush every
+    `batch_size` tweets or once the oldest buffered tweet is `flush_interval` seconds
+    old (checked by add() and tick()). Use it as a context manager, or call close(), so
+    the buffer is flushed on exit, Ctrl-C included. A batch the database rejects is
+    split in halves and retried, so only the rows that fail on their own are dropped
+    (logged and kept in `dropped`).
+
+    `index` (a KnownTweetIndex, loaded from the DB when not given) answers known() and
+    claim() without queries; it holds stored tweets plus every id claimed or added.
     """
-    ext = image_url.split('.')[-1].split('?')[0]
-    # Create a filename using tweet_id + hash of URL to avoid duplicates
-    filename = f"{tweet_id}_{abs(hash(image_url))}.{ext}"
-    local_path = os.path.join(IMAGES_DIR, filename)
-    if not os.path.exists(local_path):
+
+    def __init__(self, session: Session, batch_size=100, flush_interval=5.0, index=None):
+        self.session = session
+        self.index = index if index is not None else KnownTweetIndex.load(session)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = {}  # tweet_id -> row, in insertion order
+        self.oldest = None
+        self.stored = 0
+        self.dropped = set()  # ids of rows the database refused
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, tweet_data: dict):
+        """Buffer one tweet for insertion; tweets already buffered are ignored."""
+        tweet_id = tweet_data['tweet_id']
+        self.index.add(tweet_id)
+        if tweet_id not in self.buffer:
+            self.buffer[tweet_id] = tweet_row(tweet_data)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.tick()
+
+    def tick(self):
+        """Flush if the oldest buffered tweet has waited flush_interval seconds."""
+        if self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval:
+            self.flush()
+
+    def known(self, tweet_id: str) -> bool:
+        """True if tweet_id is stored, buffered or claimed by this run."""
+        return tweet_id in self.index
+
+    def claim(self, tweet_id: str) -> bool:
+        """Mark tweet_id as being scraped; False if it is already known (skip it)."""
+        return self.index.add(tweet_id)
+
+    def flush(self) -> int:
+        """Write the buffered tweets in one transaction; return how many were new."""
+        if not self.buffer:
+            return 0
+        batch = dict(self.buffer)
+        self.buffer.clear()
+        self.oldest = None
+        added, present = self._write(batch)
+        self.stored += added
+        print(f"Stored {added} tweets into DB ({present} already present).")
+        return added
+
+    def _write(self, batch):
+        """Insert batch's new rows on the writer thread; on an error, write each half
+        separately so one bad row does not sink the rest. Returns (added, present)."""
+
+        def write(session):
+            existing = {tid for (tid,) in session.query(Tweet.tweet_id).filter(Tweet.tweet_id.in_(list(batch)))}
+            rows = [row for tid, row in batch.items() if tid not in existing]
+            if rows:
+                # DO NOTHING also covers rows another writer (e.g. a shard merge) added meanwhile
+                session.execute(sqlite_insert(Tweet).on_conflict_do_nothing(index_elements=["tweet_id"]), rows)
+            return len(rows), len(existing)
+
         try:
-            resp = requests.get(image_url)
-            resp.raise_for_status()
-            with open(local_path, 'wb') as f:
-                f.write(resp.content)
+            return write_queue_for(self.session.get_bind()).run(write)
         except Exception as e:
-            print(f"Failed to download image {image_url}: {e}")
-            return None
-    return local_path
+            if len(batch) == 1:
+                tweet_id = next(iter(batch))
+                self.dropped.add(tweet_id)
+                print(f"⚠️ DB error, dropping tweet {tweet_id}: {e}")
+                return 0, 0
+            print(f"⚠️ DB error writing {len(batch)} tweets, retrying in halves: {e}")
+            items = list(batch.items())
+            half = len(items) // 2
+            first, second = self._write(dict(items[:half])), self._write(dict(items[half:]))
+            return first[0] + second[0], first[1] + second[1]
+
+    def close(self):
+        self.flush()
 
-def store_tweet(tweet_data: dict, session: Session, scraper_fn) -> Tweet:
+def store_tweet(tweet_data: dict, session: Session, scraper_fn, media=None) -> Tweet:
     """
     Stores a tweet and related quoted tweets into the DB.
     
@@ -43,6 +156,7 @@ def store_tweet(tweet_data: dict, session: Session, scraper_fn) -> Tweet:
             - has_video (bool)
         session (Session): SQLAlchemy session
         scraper_fn (function): Function(tweet_id) -> tweet_data dict for fetching missing quoted tweets
+        media (MediaPipeline): Downloads image_urls (e.g. src.scraper.media.MEDIA)
         
     Returns:
         Tweet object stored in DB
@@ -55,14 +169,14 @@ def store_tweet(tweet_data: dict, session: Session, scraper_fn) -> Tweet:
             print(f"Quoted tweet {quoted_id} not found in DB, scraping now...")
             quoted_data = scraper_fn(quoted_id)
             if quoted_data:
-                store_tweet(quoted_data, session, scraper_fn)
+                store_tweet(quoted_data, session, scraper_fn, media)
             else:
                 print(f"Warning: Could not fetch quoted tweet {quoted_id}")
 
     # 2. Download images locally
     local_image_paths = []
     for img_url in tweet_data.get('image_urls', []):
-        local_path = save_image_locally(img_url, tweet_data['tweet_id'])
+        local_path = save_image_locally(img_url, tweet_data['tweet_id'], media)
         if local_path:
             local_image_paths.append(local_path)
 
@@ -73,17 +187,7 @@ def store_tweet(tweet_data: dict, session: Session, scraper_fn) -> Tweet:
         return existing_tweet
 
     # 4. Create Tweet object
-    tweet = Tweet(
-        tweet_id = tweet_data['tweet_id'],
-        user_id = tweet_data['user_id'],
-        username = tweet_data['username'],
-        text = tweet_data.get('text', ''),
-        created_at = tweet_data['created_at'],
-        in_reply_to_tweet_id = tweet_data.get('in_reply_to_tweet_id'),
-        quoted_tweet_id = quoted_id,
-        image_paths = tweet_data.get('image_paths', ''),
-        video_username = tweet_data['username'] if tweet_data.get('has_video') else None,
-    )
+    tweet = Tweet(**tweet_row(tweet_data))
 
     # 5. Add and commit to DB
     session.add(tweet)
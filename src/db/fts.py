@@ -0,0 +1,102 @@
+import re
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, cast, func, literal_column, or_, text
+from sqlalchemy.exc import OperationalError
+
+# Full-text index of tweets.text plus the text of the quoted tweet. The trigram
+# tokenizer matches any substring of 3+ characters, which suits Chinese (no spaces
+# between words) as well as English. The FTS rowid is the numeric tweet id.
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts
+       USING fts5(text, quoted_text, tokenize = 'trigram case_sensitive 0')""",
+    # A new tweet is indexed with its quoted tweet's text, and tweets quoting it
+    # (stored earlier, e.g. in the same batch) pick its text up
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN
+         INSERT INTO tweets_fts(rowid, text, quoted_text)
+           VALUES (CAST(new.tweet_id AS INTEGER), new.text,
+                   (SELECT text FROM tweets WHERE tweet_id = new.quoted_tweet_id));
+         UPDATE tweets_fts SET quoted_text = new.text
+           WHERE rowid IN (SELECT CAST(tweet_id AS INTEGER) FROM tweets WHERE quoted_tweet_id = new.tweet_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF text, quoted_tweet_id ON tweets BEGIN
+         UPDATE tweets_fts SET text = new.text,
+                               quoted_text = (SELECT text FROM tweets WHERE tweet_id = new.quoted_tweet_id)
+           WHERE rowid = CAST(new.tweet_id AS INTEGER);
+         UPDATE tweets_fts SET quoted_text = new.text
+           WHERE rowid IN (SELECT CAST(tweet_id AS INTEGER) FROM tweets WHERE quoted_tweet_id = new.tweet_id);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN
+         DELETE FROM tweets_fts WHERE rowid = CAST(old.tweet_id AS INTEGER);
+       END""",
+]
+
+FTS_REBUILD = """
+INSERT INTO tweets_fts(rowid, text, quoted_text)
+SELECT CAST(t.tweet_id AS INTEGER), t.text, q.text
+FROM tweets t LEFT JOIN tweets q ON q.tweet_id = t.quoted_tweet_id
+"""
+
+# Not part of Base.metadata: create_all must not try to create it as a plain table
+tweets_fts = Table(
+    "tweets_fts", MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("text", Text),
+    Column("quoted_text", Text),
+)
+
+# Trigram queries need at least this many characters per term to use the index
+MIN_TERM_LENGTH = 3
+
+def ensure_fts(engine) -> bool:
+    """Create the FTS table and its triggers (indexing existing tweets once); False if unsupported."""
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'tweets_fts'")).first()
+        try:
+            for statement in FTS_DDL:
+                conn.execute(text(statement))
+        except OperationalError as e:
+            print(f"⚠️ Full-text search disabled (SQLite without FTS5 trigram support): {e}")
+            return False
+        if not exists:
+            conn.execute(text(FTS_REBUILD))
+    return True
+
+def fts_terms(q: str):
+    """Split a search string into terms; double quotes keep a phrase together."""
+    return [a or b for a, b in re.findall(r'"([^"]+)"|(\S+)', q or "")]
+
+def fts_condition(q: str):
+    """(condition, ranked) for tweets_fts rows matching every term of q.
+
+    Terms long enough for the trigram index go into one MATCH (ranked=True); shorter
+    ones (common in Chinese) fall back to LIKE over the FTS columns.
+    """
+    terms = fts_terms(q)
+    indexed = [t for t in terms if len(t) >= MIN_TERM_LENGTH]
+    conditions = []
+    if indexed:
+        match = " AND ".join('"' + t.replace('"', '""') + '"' for t in indexed)
+        conditions.append(literal_column("tweets_fts").op("MATCH")(match))
+    for term in terms:
+        if len(term) < MIN_TERM_LENGTH:
+            conditions.append(or_(tweets_fts.c.text.contains(term, autoescape=True),
+                                  tweets_fts.c.quoted_text.contains(term, autoescape=True)))
+    return and_(*conditions), bool(indexed)
+
+# snippet() markers, swapped for <mark> after the tweet text has been HTML-escaped
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+
+def fts_snippet():
+    """Column expression: best-matching fragment of text or quoted_text (MATCH queries only).
+
+    With the trigram tokenizer each token is about one character, so this is ~48 characters.
+    """
+    return func.snippet(literal_column("tweets_fts"), -1, MARK_OPEN, MARK_CLOSE, "…", 48)
+
+def fts_rank():
+    return func.bm25(literal_column("tweets_fts"))
+
+def fts_join_condition(tweet_id_column):
+    return tweet_id_column == cast(tweets_fts.c.rowid, Text)
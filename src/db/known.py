@@ -0,0 +1,82 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+from sqlalchemy.orm import Session
+
+from src.db.models import Tweet
+
+class KnownTweetIndex:
+    """Ids of tweets already archived or claimed by this run, for "already scraped?" checks.
+
+    Ids loaded from the DB live in a sorted array('q') (8 bytes each, binary-searched);
+    ids added during the run go into a small set that is merged into the array once it
+    holds `merge_threshold` ids, so memory stays about 8 bytes per tweet on long runs.
+    """
+
+    def __init__(self, ids=(), merge_threshold=4096):
+        self.merge_threshold = merge_threshold
+        self._sorted = array("q", sorted(set(ids)))
+        self._recent = set()
+
+    @classmethod
+    def load(cls, session: Session, **kwargs):
+        """Build the index from every tweet id stored in session's database."""
+        rows = session.query(Tweet.tweet_id).yield_per(50000)
+        return cls((int(tid) for (tid,) in rows if tid and tid.isdigit()), **kwargs)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, tweet_id) -> bool:
+        key = int(tweet_id)
+        if key in self._recent:
+            return True
+        pos = bisect_left(self._sorted, key)
+        return pos < len(self._sorted) and self._sorted[pos] == key
+
+    def count_range(self, low, high) -> int:
+        """How many known ids lie in [low, high], e.g. a scraper.snowflake_id_range() of dates."""
+        return (bisect_right(self._sorted, high) - bisect_left(self._sorted, low)
+                + sum(1 for key in self._recent if low <= key <= high))
+
+    def add(self, tweet_id) -> bool:
+        """Record tweet_id; return False if it was already known."""
+        if tweet_id in self:
+            return False
+        self._recent.add(int(tweet_id))
+        if len(self._recent) >= self.merge_threshold:
+            self._sorted = array("q", merge(self._sorted, sorted(self._recent)))
+            self._recent.clear()
+        return True
+
+class SharedTweetIndex:
+    """A process's KnownTweetIndex plus claims shared by every process of a run.
+
+    Shard processes write to databases of their own but each load the index from the
+    main one; `claims` (a multiprocessing.Manager().dict()) maps each id taken to the
+    `owner` (e.g. shard window) that took it, so an id reached from several shards (a
+    tweet they all quote, say) is still fetched only once per run.
+    """
+
+    def __init__(self, index: KnownTweetIndex, claims, owner):
+        self.index = index
+        self.claims = claims
+        self.owner = owner
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, tweet_id) -> bool:
+        return tweet_id in self.index or str(tweet_id) in self.claims
+
+    def count_range(self, low, high) -> int:
+        return self.index.count_range(low, high)
+
+    def add(self, tweet_id) -> bool:
+        """Record tweet_id; return False if it was already known here or claimed by another owner."""
+        if tweet_id in self.index:
+            return False
+        if self.claims.setdefault(str(tweet_id), self.owner) != self.owner:
+            return False
+        return self.index.add(tweet_id)
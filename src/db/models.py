@@ -1,18 +1,32 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Date, String, DateTime, ForeignKey, Index, Integer, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+def normalize_username(username):
+    """Search key of a handle: lower-case, without '@' or surrounding whitespace."""
+    return (username or "").strip(" @").lower()
+
+def _username_norm_default(context):
+    return normalize_username(context.get_current_parameters().get("username"))
+
 class Tweet(Base):
     __tablename__ = 'tweets'
+    __table_args__ = (
+        # Search results are keyset-paged on (created_at, tweet_id), with or without a
+        # username filter; both orders come straight from an index without a sort step
+        Index('ix_tweets_username_norm_created_at_id', 'username_norm', 'created_at', 'tweet_id'),
+        Index('ix_tweets_created_at_id', 'created_at', 'tweet_id'),
+    )
     tweet_id = Column(String, primary_key=True)
     user_id = Column(String, nullable=False)
     username = Column(String, nullable=False)
+    username_norm = Column(String, default=_username_norm_default)  # normalize_username(username)
     text = Column(Text)
     created_at = Column(DateTime)
-    in_reply_to_tweet_id = Column(String, ForeignKey('tweets.tweet_id'), nullable=True)
-    quoted_tweet_id = Column(String, ForeignKey('tweets.tweet_id'), nullable=True)
+    in_reply_to_tweet_id = Column(String, ForeignKey('tweets.tweet_id'), nullable=True, index=True)
+    quoted_tweet_id = Column(String, ForeignKey('tweets.tweet_id'), nullable=True, index=True)
     image_paths = Column(Text)  # comma-separated local image file paths
     video_username = Column(String)  # username if tweet has video, else None
 
@@ -23,4 +37,32 @@ class Tweet(Base):
         """Returns a list of image paths"""
         if self.image_paths:
             return [p.strip() for p in self.image_paths.split(',') if p.strip()]
-        return []
\ No newline at end of file
+        return []
+
+class MediaBlob(Base):
+    """Content-addressed media file, indexed by normalized source URL."""
+    __tablename__ = 'media_blobs'
+    url_key = Column(String, primary_key=True)  # normalize_media_url() of the source URL
+    sha256 = Column(String(64), nullable=False, index=True)
+    path = Column(Text, nullable=False)  # shared local file, images/<aa>/<bb>/<sha256>.<ext>
+    size = Column(Integer)
+    variant = Column(String)  # pbs `name=` variant stored (thumb/small/medium/large/orig), None for other media
+
+class CrawlCheckpoint(Base):
+    """Progress of scraping one user over one date range, so an interrupted run can resume."""
+    __tablename__ = 'crawl_checkpoints'
+    __table_args__ = (UniqueConstraint('username', 'start_date', 'end_date'),)
+    id = Column(Integer, primary_key=True)
+    username = Column(String, nullable=False)  # normalize_username()
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    oldest_completed = Column(Date)  # every day from here through end_date is done
+    frontier_ids = Column(Text)  # JSON [[tweet_id, depth, kind], ...] of related tweets still to fetch
+    updated_at = Column(DateTime)
+
+class CrawlDay(Base):
+    """A day of a user's tweets that has been scraped completely (shared by all ranges covering it)."""
+    __tablename__ = 'crawl_days'
+    username = Column(String, primary_key=True)  # normalize_username()
+    day = Column(Date, primary_key=True)
+    completed_at = Column(DateTime)
@@ -1,7 +1,172 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+from src.db.fts import ensure_fts
 from src.db.models import Base
 
-engine = create_engine('sqlite:///tweets.db')  # Or your chosen DB URI
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# Applied to every SQLite connection. WAL lets the web app read while the scraper
+# writes; NORMAL sync is durable across app crashes in WAL mode and skips an fsync
+# per commit; busy_timeout makes a locked writer wait instead of failing at once.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 30000,        # ms
+    "cache_size": -64000,         # KiB (negative = size, not pages)
+    "mmap_size": 256 * 1024 ** 2,  # bytes
+    "temp_store": "MEMORY",
+}
+
+def configure_sqlite(engine, pragmas=None):
+    """Run SQLITE_PRAGMAS (or pragmas) on every new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return engine
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+def make_engine(db_url, pragmas=None):
+    """Engine for db_url with the SQLite pragmas applied and the schema created/migrated."""
+    # Sessions may be handed to the write thread, so allow connections to cross threads
+    connect_args = {"check_same_thread": False} if db_url.startswith("sqlite") else {}
+    new_engine = configure_sqlite(create_engine(db_url, connect_args=connect_args), pragmas)
+    migrate(new_engine)
+    return new_engine
+
+# Fill columns added by add_missing_columns on rows written before they existed
+BACKFILLS = [
+    "UPDATE tweets SET username_norm = lower(trim(username, ' @')) WHERE username_norm IS NULL",
+]
+
+# Indexes superseded by wider ones; dropped so writes do not maintain both
+OBSOLETE_INDEXES = ["ix_tweets_username_norm_created_at", "ix_tweets_created_at"]
+
+def migrate(engine):
+    """Bring a database up to the models: new tables, new columns (backfilled) and new indexes."""
+    Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    with engine.begin() as conn:
+        for statement in BACKFILLS:
+            conn.execute(text(statement))
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    # create_all skips tables that already exist, indexes included
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    ensure_fts(engine)
+
+def add_missing_columns(engine):
+    """Add model columns missing from existing tables (create_all only creates new tables)."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+# XSCRAPER_DB_URL points the app and scraper at another database (e.g. in tests)
+engine = make_engine(os.environ.get('XSCRAPER_DB_URL', 'sqlite:///tweets.db'))  # Or your chosen DB URI
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_session_factory(db_url):
+    """Return a sessionmaker for another database (e.g. a shard), creating its tables."""
+    return sessionmaker(autocommit=False, autoflush=False, bind=make_engine(db_url))
+
+class WriteQueue:
+    """Single writer thread for one database.
+
+    SQLite allows one writer at a time, so every writer of a run (tweet batches, media
+    index rows from the download threads, ...) submits its work here instead of
+    committing on its own connection. submit(fn) runs fn(session) on the writer thread,
+    commits, and resolves the returned Future to fn's result (or its exception, after
+    a rollback).
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._jobs.put((fn, future))
+        return future
+
+    def run(self, fn):
+        """submit(fn) and wait for its result."""
+        return self.submit(fn).result()
+
+    def _run(self):
+        session = Session(bind=self.bind, autoflush=False)
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                fn, future = job
+                try:
+                    result = fn(session)
+                    session.commit()
+                    future.set_result(result)
+                except Exception as e:
+                    session.rollback()
+                    future.set_exception(e)
+        finally:
+            session.close()
+
+    def close(self):
+        """Finish the queued writes and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._jobs.put(None)
+        if thread is not None:
+            thread.join()
+
+_write_queues = {}
+_write_queues_lock = threading.Lock()
+
+def write_queue_for(bind) -> WriteQueue:
+    """The shared WriteQueue of an engine (one writer thread per database)."""
+    with _write_queues_lock:
+        if bind not in _write_queues:
+            _write_queues[bind] = WriteQueue(bind)
+        return _write_queues[bind]
+
+def dispose_engine(bind):
+    """Stop bind's writer thread and close its connections, checkpointing the WAL into the
+    database file first (for a database that is about to be moved or deleted)."""
+    with _write_queues_lock:
+        write_queue = _write_queues.pop(bind, None)
+    if write_queue is not None:
+        write_queue.close()
+    if bind.dialect.name == "sqlite":
+        with bind.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    bind.dispose()
+
+@atexit.register
+def close_write_queues():
+    for write_queue in list(_write_queues.values()):
+        write_queue.close()
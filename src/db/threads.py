@@ -0,0 +1,59 @@
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.orm import aliased
+
+from src.db.models import Tweet
+
+# Default and hard limits for one thread view
+MAX_ANCESTORS = 100
+MAX_DEPTH = 50
+MAX_REPLIES = 500
+
+# Tweet ids are decimal snowflakes of varying length; zero-padded they sort numerically,
+# i.e. in posting order
+ID_WIDTH = 20
+
+def _sort_key(tweet_id_column):
+    return func.substr("0" * ID_WIDTH + tweet_id_column, -ID_WIDTH)
+
+def thread_members(tweet_id, max_ancestors=MAX_ANCESTORS, max_depth=MAX_DEPTH, max_replies=MAX_REPLIES):
+    """Subquery of (tweet_id, depth, path) for the conversation around tweet_id.
+
+    Ancestors (the in_reply_to chain, up to max_ancestors hops) get depths -1, -2, ...,
+    the tweet itself 0 and replies to it 1, 2, ... (up to max_depth). path is the
+    '/'-joined sort keys from the tweet down to a reply, so ordering by it lists the
+    reply tree depth-first with siblings oldest first. At most max_replies + 1 replies
+    are kept, shallowest first, so a truncated tree is still connected and callers can
+    tell it was cut. Both walks are one WITH RECURSIVE query over the primary key and
+    ix_tweets_in_reply_to_tweet_id.
+    """
+    ancestors = (select(Tweet.tweet_id, Tweet.in_reply_to_tweet_id.label("parent_id"), literal(0).label("depth"))
+                 .where(Tweet.tweet_id == tweet_id)
+                 .cte("ancestors", recursive=True))
+    parent = aliased(Tweet)
+    ancestors = ancestors.union_all(
+        select(parent.tweet_id, parent.in_reply_to_tweet_id, ancestors.c.depth - 1)
+        .where(parent.tweet_id == ancestors.c.parent_id, ancestors.c.depth > -max_ancestors))
+
+    descendants = (select(Tweet.tweet_id, literal(0).label("depth"), literal("").label("path"))
+                   .where(Tweet.tweet_id == tweet_id)
+                   .cte("descendants", recursive=True))
+    child = aliased(Tweet)
+    descendants = descendants.union_all(
+        select(child.tweet_id, descendants.c.depth + 1, descendants.c.path + "/" + _sort_key(child.tweet_id))
+        .where(child.in_reply_to_tweet_id == descendants.c.tweet_id, descendants.c.depth < max_depth))
+
+    replies = (select(descendants.c.tweet_id, descendants.c.depth, descendants.c.path)
+               .where(descendants.c.depth > 0)
+               .order_by(descendants.c.depth, descendants.c.path)
+               .limit(max_replies + 1)
+               .subquery())
+    return (select(ancestors.c.tweet_id, ancestors.c.depth, literal("").label("path"))
+            .union_all(select(replies))
+            .subquery("thread"))
+
+def thread_query(session, tweet_id, **limits):
+    """Query of (Tweet, depth, path) rows in reading order: root first, replies depth-first."""
+    members = thread_members(tweet_id, **limits)
+    return (session.query(Tweet, members.c.depth, members.c.path)
+            .join(members, Tweet.tweet_id == members.c.tweet_id)
+            .order_by(case((members.c.depth <= 0, members.c.depth), else_=1), members.c.path))
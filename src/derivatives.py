@@ -0,0 +1,150 @@
+"""Resized / re-encoded copies of stored images for the web UI.
+
+Derivatives are made on first request (see the /images route) or ahead of time with
+
+    python -m src.derivatives warm [--workers N]
+    python -m src.derivatives gc
+
+and cached under DERIVATIVES_DIR as <key>-w<width>.<ext>. The key identifies the
+source bytes (the sha256 of content-addressed files, else a hash of name, size and
+mtime), so a derivative is never regenerated and never goes stale in place; gc removes
+those whose source is gone or whose width/format is no longer offered.
+
+Pillow is optional: without it the originals are served.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow not installed: no derivatives
+    Image = None
+
+IMAGES_DIR = Path(__file__).parent.parent / "images"
+DERIVATIVES_DIR = Path(__file__).parent.parent / "derivatives"
+
+# Widths offered in srcset; requests snap up to one of these so the cache stays bounded
+THUMB_WIDTHS = (320, 640, 1280)
+
+# (mime type, Pillow format, extension, save options), most preferred first
+MODERN_FORMATS = [
+    ("image/avif", "AVIF", "avif", {"quality": 55}),
+    ("image/webp", "WEBP", "webp", {"quality": 80, "method": 4}),
+]
+FALLBACK_FORMAT = ("image/jpeg", "JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True})
+
+CONTENT_ADDRESSED_NAME = re.compile(r"[0-9a-f]{64}")
+DERIVATIVE_NAME = re.compile(r"(?P<key>[0-9a-f]{64})-w(?P<width>\d+)\.(?P<ext>\w+)")
+
+# Striped locks: one generator per derivative, without a lock object per file ever served
+_locks = [threading.Lock() for _ in range(64)]
+
+def available() -> bool:
+    return Image is not None
+
+def supported_formats():
+    """MODERN_FORMATS this Pillow build can encode, plus the JPEG fallback."""
+    if Image is None:
+        return []
+    return [f for f in MODERN_FORMATS if features.check(f[2])] + [FALLBACK_FORMAT]
+
+def source_key(path: Path) -> str:
+    """Stable identity of a stored image's bytes."""
+    if CONTENT_ADDRESSED_NAME.fullmatch(path.stem):
+        return path.stem
+    stat = path.stat()
+    return hashlib.sha256(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+def snap_width(width: int) -> int:
+    """Smallest offered width covering `width` (the largest one past the end)."""
+    return next((w for w in THUMB_WIDTHS if w >= width), THUMB_WIDTHS[-1])
+
+def negotiate_format(accept_header: str):
+    """Best supported format for a request's Accept header."""
+    accept = accept_header or ""
+    for fmt in supported_formats():
+        if fmt is FALLBACK_FORMAT or fmt[0] in accept:
+            return fmt
+    return None
+
+def derivative_path(key: str, width: int, ext: str) -> Path:
+    return DERIVATIVES_DIR / key[:2] / f"{key}-w{width}.{ext}"
+
+def _lock_for(path: Path):
+    return _locks[hash(path.name) % len(_locks)]
+
+def ensure_derivative(source: Path, width: int, fmt):
+    """Path of the width/format derivative of source, generating it if missing; None on failure."""
+    if Image is None or fmt is None:
+        return None
+    mime, pil_format, ext, options = fmt
+    width = snap_width(width)
+    target = derivative_path(source_key(source), width, ext)
+    if target.exists():
+        return target
+    # Concurrent requests for one derivative wait for the first instead of redoing it
+    with _lock_for(target):
+        if target.exists():
+            return target
+        try:
+            with Image.open(source) as img:
+                img = ImageOps.exif_transpose(img)
+                if img.width > width:
+                    img.thumbnail((width, max(1, img.height * width // img.width)))
+                if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = target.with_name(f"{target.name}.{threading.get_ident()}.part")
+                img.save(tmp_path, pil_format, **options)
+                os.replace(tmp_path, target)
+        except Exception as e:
+            print(f"⚠️ Could not make {target.name} from {source}: {e}")
+            return None
+    return target
+
+def iter_sources(images_dir=IMAGES_DIR):
+    for path in images_dir.rglob("*"):
+        if path.is_file() and not path.name.endswith(".part"):
+            yield path
+
+def warm(workers=4, images_dir=IMAGES_DIR):
+    """Eagerly generate every offered width in every supported modern format (and JPEG)."""
+    sources = list(iter_sources(images_dir))
+    jobs = [(path, width, fmt) for path in sources for width in THUMB_WIDTHS for fmt in supported_formats()]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="derive") as pool:
+        made = sum(1 for result in pool.map(lambda job: ensure_derivative(*job), jobs) if result)
+    print(f"{made}/{len(jobs)} derivatives present for {len(sources)} images")
+
+def collect_garbage(images_dir=IMAGES_DIR):
+    """Delete derivatives whose source image is gone or whose width/format is no longer offered."""
+    live_keys = {source_key(path) for path in iter_sources(images_dir)}
+    extensions = {fmt[2] for fmt in supported_formats()}
+    removed = 0
+    for path in DERIVATIVES_DIR.rglob("*"):
+        if not path.is_file() or path.name.endswith(".part"):
+            continue
+        match = DERIVATIVE_NAME.fullmatch(path.name)
+        if (match is None or match["key"] not in live_keys or int(match["width"]) not in THUMB_WIDTHS
+                or match["ext"] not in extensions):
+            path.unlink()
+            removed += 1
+    print(f"Removed {removed} stale derivatives")
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image derivative cache")
+    parser.add_argument("command", choices=["warm", "gc"])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    if not available():
+        print("Error: Pillow is not installed (pip install Pillow).")
+        exit(1)
+    if args.command == "warm":
+        warm(args.workers)
+    else:
+        collect_garbage()
@@ -0,0 +1,121 @@
+import datetime
+import json
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.db.models import CrawlCheckpoint, CrawlDay, normalize_username
+from src.db.session import write_queue_for
+
+def days_between(start_date, end_date):
+    return [start_date + datetime.timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+
+def completed_days(session: Session, user, start_date, end_date):
+    """Days in [start_date, end_date] already scraped completely for user."""
+    rows = session.query(CrawlDay.day).filter(
+        CrawlDay.username == normalize_username(user),
+        CrawlDay.day >= start_date,
+        CrawlDay.day <= end_date,
+    )
+    return {day for (day,) in rows}
+
+def unfinished_windows(start_date, end_date, done):
+    """Contiguous (start, end) runs of days not in done, newest first (timeline order)."""
+    windows = []
+    for day in reversed(days_between(start_date, end_date)):
+        if day in done:
+            continue
+        if windows and windows[-1][0] == day + datetime.timedelta(days=1):
+            windows[-1] = (day, windows[-1][1])
+        else:
+            windows.append((day, day))
+    return windows
+
+class CrawlCheckpointer:
+    """Persisted progress of one scrape of `user` over [start_date, end_date].
+
+    Days are marked complete (CrawlDay rows, shared by every range covering them) once
+    the timeline has scrolled past them and their tweets are stored; days from today on
+    never are, since they can still get tweets. save() records the oldest day from which
+    the range is complete and the related-tweet frontier in the range's CrawlCheckpoint.
+    A new run over the same range resumes with unfinished_windows() and the saved
+    frontier. Writes go through the database's shared writer thread. A day with a tweet
+    that could not be fetched or stored (record_failure) is never marked in this run,
+    so a rerun scrapes it again.
+    """
+
+    def __init__(self, session: Session, user, start_date, end_date):
+        self.bind = session.get_bind()
+        self.username = normalize_username(user)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.done = completed_days(session, user, start_date, end_date)
+        row = session.query(CrawlCheckpoint).filter_by(
+            username=self.username, start_date=start_date, end_date=end_date).first()
+        self.frontier = json.loads(row.frontier_ids) if row is not None and row.frontier_ids else []
+        self.failed = {}  # tweet_id -> day of tweets lost this run
+
+    def record_failure(self, tweet_id, day):
+        """Keep day unfinished: tweet_id, posted on it, was not fetched or not stored."""
+        if day is None or tweet_id in self.failed:
+            return
+        self.failed[tweet_id] = day
+        if self.start_date <= day <= self.end_date:
+            print(f"⚠️ Tweet {tweet_id} was not stored; {day} stays unfinished for the next run")
+
+    def windows(self):
+        return unfinished_windows(self.start_date, self.end_date, self.done)
+
+    def oldest_completed(self):
+        oldest = None
+        for day in reversed(days_between(self.start_date, self.end_date)):
+            if day not in self.done:
+                break
+            oldest = day
+        return oldest
+
+    def pending_days(self, newest_visible, window_start, window_end):
+        """Days of the window being scraped that are newer than newest_visible (so already
+        scrolled past) and not yet marked."""
+        first = max(window_start, newest_visible + datetime.timedelta(days=1))
+        if first > window_end:
+            return []
+        return [day for day in days_between(first, window_end) if day not in self.done]
+
+    def mark_done(self, days, frontier=None):
+        """Record days as complete (their tweets must be stored already) and save."""
+        failed_days = set(self.failed.values())
+        days = [day for day in days
+                if day < datetime.date.today() and day not in self.done and day not in failed_days]
+        if days:
+            now = datetime.datetime.utcnow()
+            rows = [{"username": self.username, "day": day, "completed_at": now} for day in days]
+
+            def insert_days(session):
+                session.execute(sqlite_insert(CrawlDay).on_conflict_do_nothing(index_elements=["username", "day"]),
+                                rows)
+
+            write_queue_for(self.bind).run(insert_days)
+            self.done.update(days)
+            print(f"Checkpoint: {len(self.done)} of {(self.end_date - self.start_date).days + 1} days done")
+        self.save(frontier)
+
+    def save(self, frontier=None):
+        """Upsert this range's CrawlCheckpoint with the current progress and frontier."""
+        if frontier is not None:
+            self.frontier = frontier.snapshot()
+        values = {
+            "username": self.username,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "oldest_completed": self.oldest_completed(),
+            "frontier_ids": json.dumps(self.frontier),
+            "updated_at": datetime.datetime.utcnow(),
+        }
+
+        def upsert(session):
+            session.execute(sqlite_insert(CrawlCheckpoint).values(values).on_conflict_do_update(
+                index_elements=["username", "start_date", "end_date"],
+                set_={k: values[k] for k in ("oldest_completed", "frontier_ids", "updated_at")}))
+
+        write_queue_for(self.bind).run(upsert)
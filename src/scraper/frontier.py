@@ -0,0 +1,81 @@
+import heapq
+import itertools
+
+# How many hops of quoted / replied-to tweets to follow from a timeline tweet
+MAX_RELATED_DEPTH = 3
+
+# tweet_data fields that point at related tweets, keyed by the kind names used for --prefer
+RELATED_FIELDS = {"quotes": "quoted_tweet_id", "replies": "in_reply_to_tweet_id"}
+
+class RelatedFrontier:
+    """Run-wide breadth-first queue of quoted / replied-to tweet ids still to fetch.
+
+    Timeline tweets are depth 0; the tweets they quote or reply to are depth 1, and so
+    on up to max_depth. Ids go in through `claim` (TweetWriter.claim), so an id that is
+    already stored, buffered, queued or being scraped is never queued again: every id is
+    fetched at most once per run. pop() returns the shallowest id first and, within a
+    depth, the `prefer`red kind first, then the oldest push.
+    """
+
+    def __init__(self, claim, max_depth=MAX_RELATED_DEPTH, prefer="quotes"):
+        self.claim = claim
+        self.max_depth = max_depth
+        self.rank = {kind: 0 if kind == prefer else 1 for kind in RELATED_FIELDS}
+        self.heap = []
+        self.kinds = {}  # tweet_id -> kind it was pushed as, kept through pop() for requeue/fail
+        self.order = itertools.count()
+        self.pushed = 0
+        self.skipped_known = 0
+        self.skipped_depth = 0
+        self.failed = []  # [tweet_id, depth, kind] fetched without result, kept for the next run
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, tweet_id, depth, kind="quotes") -> bool:
+        """Queue tweet_id at depth; False if it is too deep or already known."""
+        if depth > self.max_depth:
+            self.skipped_depth += 1
+            return False
+        if not self.claim(tweet_id):
+            self.skipped_known += 1
+            return False
+        heapq.heappush(self.heap, (depth, self.rank[kind], next(self.order), tweet_id))
+        self.kinds[tweet_id] = kind
+        self.pushed += 1
+        return True
+
+    def push_related(self, tweet_data, depth) -> int:
+        """Queue the tweets that tweet_data (found at depth) quotes or replies to; return how many."""
+        return sum(self.push(tweet_data[field], depth + 1, kind)
+                   for kind, field in RELATED_FIELDS.items() if tweet_data.get(field))
+
+    def requeue(self, tweet_id, depth):
+        """Put back an id taken by pop() but not fetched (e.g. on Ctrl-C); it goes first in its depth."""
+        heapq.heappush(self.heap, (depth, -1, next(self.order), tweet_id))
+
+    def fail(self, tweet_id, depth):
+        """Record that fetching a popped id failed; snapshot() keeps it so a resumed run retries it."""
+        self.failed.append([tweet_id, depth, self.kinds.get(tweet_id, "quotes")])
+
+    def pop(self):
+        """(tweet_id, depth) of the next tweet to fetch, or None when empty."""
+        if not self.heap:
+            return None
+        depth, _, _, tweet_id = heapq.heappop(self.heap)
+        return tweet_id, depth
+
+    def snapshot(self):
+        """[[tweet_id, depth, kind], ...] still queued, best first, then the failed ones
+        (for CrawlCheckpoint.frontier_ids)."""
+        queued = [[tweet_id, depth, self.kinds.get(tweet_id, "quotes")] for depth, _, _, tweet_id in sorted(self.heap)]
+        return queued + self.failed
+
+    def restore(self, items):
+        """Queue [tweet_id, depth, kind] entries saved by snapshot() (older checkpoints have no
+        kind: quotes); return how many were still needed."""
+        return sum(self.push(tweet_id, depth, *kind) for tweet_id, depth, *kind in items)
+
+    def report(self):
+        print(f"Related tweets: {self.pushed} queued, {self.skipped_known} already known, "
+              f"{self.skipped_depth} beyond depth {self.max_depth}, {len(self.failed)} failed")
@@ -0,0 +1,126 @@
+import datetime
+import html
+import inspect
+
+# GraphQL operations whose payloads carry tweet results we can ingest directly
+GRAPHQL_OPERATIONS = ("UserTweets", "UserTweetsAndReplies", "TweetDetail", "SearchTimeline")
+
+def is_tweet_payload_url(url: str) -> bool:
+    """True if url is one of X's GraphQL timeline/detail endpoints."""
+    if "/graphql/" not in url:
+        return False
+    path = url.split("?", 1)[0]
+    return any(path.endswith(f"/{op}") for op in GRAPHQL_OPERATIONS)
+
+def iter_tweet_results(node):
+    """Yield every tweet result object nested anywhere in a GraphQL payload.
+
+    Walking the whole payload (instead of following instructions/entries paths)
+    also picks up quoted tweets, retweeted originals and conversation modules.
+    """
+    if isinstance(node, dict):
+        legacy = node.get("legacy")
+        if node.get("rest_id") and isinstance(legacy, dict) and "full_text" in legacy:
+            yield node
+        for value in node.values():
+            yield from iter_tweet_results(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_tweet_results(value)
+
+def _screen_name(result: dict):
+    user = (((result.get("core") or {}).get("user_results") or {}).get("result")) or {}
+    return ((user.get("legacy") or {}).get("screen_name")
+            or (user.get("core") or {}).get("screen_name"))
+
+def _full_text(result: dict) -> str:
+    """Untruncated tweet text: note_tweet for long posts, else full_text minus trailing media links."""
+    note = (((result.get("note_tweet") or {}).get("note_tweet_results") or {}).get("result")) or {}
+    if note.get("text"):
+        return html.unescape(note["text"]).strip()
+    legacy = result["legacy"]
+    text = legacy.get("full_text", "")
+    text_range = legacy.get("display_text_range")
+    if text_range and len(text_range) == 2:
+        text = text[text_range[0]:text_range[1]]
+    return html.unescape(text).strip()
+
+def parse_tweet_result(result: dict):
+    """Map one GraphQL tweet result into the dict shape expected by store_tweet."""
+    legacy = result["legacy"]
+    tweet_id = result.get("rest_id") or legacy.get("id_str")
+    if not tweet_id:
+        return None
+
+    created_at = None
+    if legacy.get("created_at"):
+        created_at = datetime.datetime.strptime(legacy["created_at"], "%a %b %d %H:%M:%S %z %Y").astimezone()
+
+    quoted_tweet_id = legacy.get("quoted_status_id_str")
+    if not quoted_tweet_id:
+        quoted = ((result.get("quoted_status_result") or {}).get("result")) or {}
+        quoted = quoted.get("tweet", quoted)  # TweetWithVisibilityResults wrapper
+        quoted_tweet_id = quoted.get("rest_id")
+
+    media = (legacy.get("extended_entities") or legacy.get("entities") or {}).get("media") or []
+    image_urls = [m["media_url_https"] for m in media if m.get("type") == "photo" and m.get("media_url_https")]
+    has_video = any(m.get("type") in ("video", "animated_gif") for m in media)
+
+    username = _screen_name(result) or "unknown"
+    return {
+        "tweet_id": tweet_id,
+        "user_id": legacy.get("user_id_str") or username,
+        "username": username,
+        "text": _full_text(result),
+        "created_at": created_at,
+        "in_reply_to_tweet_id": legacy.get("in_reply_to_status_id_str"),
+        "quoted_tweet_id": quoted_tweet_id,
+        "image_urls": image_urls,
+        "quoted_image_urls": [],
+        "has_video": has_video,
+    }
+
+class GraphQLCollector:
+    """Collect tweets from intercepted GraphQL responses, keyed by tweet id."""
+
+    def __init__(self):
+        self.tweets = {}
+
+    def attach(self, target):
+        """Listen to responses of a Playwright page or browser context."""
+        target.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if not is_tweet_payload_url(response.url):
+            return None
+        try:
+            payload = response.json()
+        except Exception as e:
+            print(f"⚠️ Could not parse GraphQL payload from {response.url}: {e}")
+            return None
+        if inspect.isawaitable(payload):
+            # Async Playwright API: the event emitter schedules the returned coroutine
+            return self._ingest_later(response.url, payload)
+        self.ingest(payload)
+        return None
+
+    async def _ingest_later(self, url, pending_payload):
+        try:
+            self.ingest(await pending_payload)
+        except Exception as e:
+            print(f"⚠️ Could not parse GraphQL payload from {url}: {e}")
+
+    def ingest(self, payload) -> int:
+        """Parse every tweet in payload; return how many were collected."""
+        count = 0
+        for result in iter_tweet_results(payload):
+            tweet_data = parse_tweet_result(result)
+            if tweet_data:
+                self.tweets[tweet_data["tweet_id"]] = tweet_data
+                count += 1
+        return count
+
+    def get(self, tweet_id):
+        """Return a copy of the collected tweet_data for tweet_id, or None."""
+        tweet_data = self.tweets.get(tweet_id)
+        return dict(tweet_data) if tweet_data else None
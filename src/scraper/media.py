@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import update
+
+from src.db.models import MediaBlob, Tweet
+from src.db.session import SessionLocal, write_queue_for
+from src.scraper.ratelimit import RATE_LIMITER, host_key
+
+MEDIA_ROOT = Path("images")
+
+# Leading bytes of the formats X serves, for URLs that do not name one
+MAGIC_EXTENSIONS = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG", "png"), (b"GIF8", "gif"), (b"RIFF", "webp"))
+
+# X's pbs `name=` variants, lowest quality first ("medium" is what the site serves by default)
+MEDIA_VARIANTS = ("thumb", "small", "medium", "large", "orig")
+
+# Plain HTTP answers meaning the host wants the browser's login session
+AUTH_STATUSES = (401, 403)
+
+def is_pbs_media(url: str) -> bool:
+    parts = urlsplit(url)
+    return parts.netloc.lower() == "pbs.twimg.com" and parts.path.startswith("/media/")
+
+def normalize_media_url(url: str) -> str:
+    """Canonical form of a media URL, used as its index key.
+
+    X serves the same picture as /media/ID.jpg, /media/ID.jpg?name=small and
+    /media/ID?format=jpg&name=small; pbs media URLs are rewritten to the last form
+    (name defaults to X's `medium`) with other query parameters dropped.
+    """
+    parts = urlsplit(url)
+    scheme, host, path = parts.scheme, parts.netloc.lower(), parts.path
+    query = dict(parse_qsl(parts.query))
+    if is_pbs_media(url):
+        scheme = "https"
+        stem = path.rsplit("/", 1)[-1]
+        if "." in stem:
+            path, ext = path.rsplit(".", 1)
+            query.setdefault("format", ext)
+        query.setdefault("name", "medium")
+        query = {k: query[k] for k in ("format", "name") if k in query}
+    return urlunsplit((scheme, host, path, urlencode(sorted(query.items())), ""))
+
+def apply_media_variant(url: str, variant) -> str:
+    """Rewrite a pbs media URL to request `variant`; other URLs (or variant None) are returned as is."""
+    if not variant or not is_pbs_media(url):
+        return url
+    parts = urlsplit(normalize_media_url(url))
+    query = dict(parse_qsl(parts.query), name=variant)
+    return urlunsplit(parts._replace(query=urlencode(sorted(query.items()))))
+
+def media_variant(url: str):
+    """The pbs variant name a media URL asks for, or None for non-pbs media."""
+    if not is_pbs_media(url):
+        return None
+    return dict(parse_qsl(urlsplit(normalize_media_url(url)).query)).get("name")
+
+def variant_rank(variant) -> int:
+    """Position of variant in MEDIA_VARIANTS; unknown names rank below thumb."""
+    return MEDIA_VARIANTS.index(variant) if variant in MEDIA_VARIANTS else -1
+
+def media_extension(url_key: str, content: bytes) -> str:
+    query = dict(parse_qsl(urlsplit(url_key).query))
+    if query.get("format"):
+        return query["format"]
+    stem = urlsplit(url_key).path.rsplit("/", 1)[-1]
+    if "." in stem:
+        return stem.rsplit(".", 1)[-1].lower()
+    for magic, ext in MAGIC_EXTENSIONS:
+        if content.startswith(magic):
+            return ext
+    return "jpg"
+
+class MediaStore:
+    """Content-addressed media files with a URL -> file index kept in the media_blobs table.
+
+    Files live at <root>/<sha[:2]>/<sha[2:4]>/<sha256>.<ext>, so identical bytes are
+    stored once no matter how many tweets or URLs reference them.
+    """
+
+    def __init__(self, root=MEDIA_ROOT, session_factory=SessionLocal):
+        self.root = Path(root)
+        self.session_factory = session_factory
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        if self._index is None:
+            session = self.session_factory()
+            try:
+                self._index = dict(session.query(MediaBlob.url_key, MediaBlob.path).all())
+            finally:
+                session.close()
+        return self._index
+
+    def lookup(self, url):
+        """Local path already stored for url, or None."""
+        with self._lock:
+            path = self._load_index().get(normalize_media_url(url))
+        return path if path and os.path.exists(path) else None
+
+    def put(self, url, content: bytes) -> str:
+        """Store content downloaded from url and return its shared local path."""
+        url_key = normalize_media_url(url)
+        sha = hashlib.sha256(content).hexdigest()
+        path = self.root / sha[:2] / sha[2:4] / f"{sha}.{media_extension(url_key, content)}"
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._load_index()[url_key] = str(path)
+        blob = MediaBlob(url_key=url_key, sha256=sha, path=str(path), size=len(content), variant=media_variant(url_key))
+
+        def index_blob(session):
+            session.merge(blob)
+
+        def report(write):
+            if write.exception():
+                print(f"⚠️ Could not index media {url_key}: {write.exception()}")
+
+        # Indexed on the database's writer thread; the in-memory index above already serves lookups
+        write_queue_for(self.session_factory.kw["bind"]).submit(index_blob).add_done_callback(report)
+        return str(path)
+
+class MediaPipeline:
+    """Background image downloader shared by the whole run.
+
+    Downloads run on a thread pool over one keep-alive requests.Session, with at most
+    `per_host` concurrent connections per host, into a MediaStore. submit() returns a
+    Future that resolves to the local path (or None); URLs already in the store resolve
+    immediately and concurrent submits of one URL share a download. Downloads that fail
+    over plain HTTP are parked for the browser fallback, which only the thread owning the
+    Playwright objects may run: that thread calls pump() (or pump_async()) regularly.
+    Hosts that refused plain HTTP with an AUTH_STATUSES answer but served the browser
+    are remembered in auth_hosts and skip the plain HTTP attempt from then on; other
+    failures (timeouts, 5xx, 429) are retried in the browser without that. `variant` is
+    the run's media variant policy: pbs media URLs are rewritten to that `name=` before
+    being looked up or fetched.
+    """
+
+    def __init__(self, workers=8, per_host=4, timeout=10, store=None, variant=None):
+        self.workers = workers
+        self.variant = variant
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._fallback_jobs = queue.Queue()
+        self._inflight = {}
+        self.auth_hosts = set()
+        self.store = store or MediaStore()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media")
+            return self._executor
+
+    def _slot(self, url):
+        with self._lock:
+            return self._host_slots[host_key(url)]
+
+    def submit(self, url, fallback=True, variant=None) -> Future:
+        """Queue url for download. With fallback=False failures resolve to None instead
+        of waiting for pump(). variant overrides the pipeline's variant policy."""
+        url = apply_media_variant(url, variant or self.variant)
+        url_key = normalize_media_url(url)
+        with self._lock:
+            future = self._inflight.get(url_key)
+            if future is not None:
+                return future
+            known_path = self.store.lookup(url)
+            future = Future()
+            if known_path:
+                future.set_result(known_path)
+                return future
+            self._inflight[url_key] = future
+        future.add_done_callback(lambda _: self._forget(url_key))
+        self.executor.submit(self._download, url, future, fallback)
+        return future
+
+    def _forget(self, url_key):
+        with self._lock:
+            self._inflight.pop(url_key, None)
+
+    def fetch(self, url):
+        """GET url through the pooled, rate-limited session; return (bytes or None, HTTP status)."""
+        with self._slot(url):
+            RATE_LIMITER.acquire(url)
+            response = self.session.get(url, timeout=self.timeout)
+        RATE_LIMITER.observe(url, response.status_code, response.headers)
+        if response.status_code == 200 and response.content:
+            return response.content, response.status_code
+        print(f"requests.get failed with status {response.status_code} for {url}")
+        return None, response.status_code
+
+    def _download(self, url, future, fallback):
+        if fallback and host_key(url) in self.auth_hosts:
+            self._fallback_jobs.put((url, future, None))
+            return
+        status = None
+        try:
+            content, status = self.fetch(url)
+            if content is not None:
+                future.set_result(self.store.put(url, content))
+                return
+        except Exception as e:
+            print(f"⚠️ requests image download failed: {e}")
+        if fallback:
+            self._fallback_jobs.put((url, future, status))
+        else:
+            future.set_result(None)
+
+    def _parked_jobs(self, max_jobs=None):
+        jobs = []
+        while max_jobs is None or len(jobs) < max_jobs:
+            try:
+                jobs.append(self._fallback_jobs.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _finish_fallback(self, url, future, http_status, content):
+        """Resolve a parked job; http_status is what plain HTTP answered (None if not tried or no answer)."""
+        if content:
+            if http_status in AUTH_STATUSES and host_key(url) not in self.auth_hosts:
+                print(f"Media from {host_key(url)} needs the browser session; skipping plain requests for it from now on.")
+                self.auth_hosts.add(host_key(url))
+            future.set_result(self.store.put(url, content))
+        else:
+            print(f"⚠️ Failed to download image by any means: {url}")
+            future.set_result(None)
+
+    def pump(self, fallback_fn=None, max_jobs=None):
+        """Run parked fallback downloads on the calling (browser) thread.
+
+        fallback_fn(url) -> bytes or None; without one the parked jobs resolve to None.
+        max_jobs bounds how long one call may hold up the caller.
+        """
+        for url, future, http_status in self._parked_jobs(max_jobs):
+            content = None
+            if fallback_fn is not None:
+                try:
+                    content = fallback_fn(url)
+                except Exception as e:
+                    print(f"Playwright backup image download failed: {e}")
+            self._finish_fallback(url, future, http_status, content)
+
+    async def pump_async(self, fallback_fn, concurrency=4):
+        """Async pump(): run parked jobs with at most `concurrency` fallback requests in flight.
+
+        fallback_fn is a coroutine function url -> bytes or None.
+        """
+        limit = asyncio.Semaphore(concurrency)
+
+        async def run(url, future, http_status):
+            content = None
+            async with limit:
+                try:
+                    content = await fallback_fn(url)
+                except Exception as e:
+                    print(f"Playwright backup image download failed: {e}")
+            self._finish_fallback(url, future, http_status, content)
+
+        await asyncio.gather(*(run(*job) for job in self._parked_jobs()))
+
+    def wait(self, futures, fallback_fn=None, poll=0.1):
+        """Block until futures are done, pumping fallback jobs meanwhile."""
+        while not all(f.done() for f in futures):
+            self.pump(fallback_fn)
+            time.sleep(poll)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.pump()
+
+MEDIA = MediaPipeline()
+
+def upgrade_media(session, tweets, variant, pipeline=None):
+    """Re-fetch the pbs images of `tweets` stored below `variant` and point the tweets at the new files.
+
+    A stored file counts at the best variant any index entry records for it, so images
+    already at or above `variant` (and non-pbs media) are left alone. Failed downloads
+    keep the old file. Returns the number of tweets updated.
+    """
+    pipeline = pipeline or MEDIA
+    target = variant_rank(variant)
+    ranks, sources = {}, {}  # local path -> best stored rank / the url_key it came from
+    for url_key, path, stored in session.query(MediaBlob.url_key, MediaBlob.path, MediaBlob.variant):
+        if not is_pbs_media(url_key):
+            continue
+        rank = variant_rank(stored or media_variant(url_key))
+        if path not in ranks or rank > ranks[path]:
+            ranks[path], sources[path] = rank, url_key
+
+    upgrades = {}  # old path -> Future of the upgraded file
+    stale_tweets = []
+    for tweet in tweets:
+        stale = [p for p in tweet.images() if p in ranks and ranks[p] < target]
+        for path in stale:
+            if path not in upgrades:
+                upgrades[path] = pipeline.submit(sources[path], fallback=False, variant=variant)
+        if stale:
+            stale_tweets.append(tweet)
+    print(f"Upgrading {len(upgrades)} images of {len(stale_tweets)} tweets to '{variant}'")
+    pipeline.wait(list(upgrades.values()))
+
+    changes = []
+    for tweet in stale_tweets:
+        paths = [(upgrades[p].result() or p) if p in upgrades else p for p in tweet.images()]
+        if paths != tweet.images():
+            changes.append({"tweet_id": tweet.tweet_id, "image_paths": ",".join(paths)})
+
+    def update_paths(write_session):
+        write_session.execute(update(Tweet), changes)
+
+    # Through the database's writer thread, like every other write of a run
+    if changes:
+        write_queue_for(session.get_bind()).run(update_paths)
+        for tweet in stale_tweets:
+            session.expire(tweet, ["image_paths"])
+    return len(changes)
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
+
+import src.scraper.scraper as scraper
+from src.db.crud import TweetWriter
+from src.db.session import SessionLocal
+from src.scraper.checkpoint import CrawlCheckpointer
+from src.scraper.frontier import MAX_RELATED_DEPTH, RelatedFrontier
+from src.scraper.graphql import GraphQLCollector
+from src.scraper.media import MEDIA
+from src.scraper.ratelimit import RATE_LIMITER
+from src.scraper.routing import ROUTE_PROFILES, install_route_filter
+from src.scraper.waits import TEXT_EXPANDED_JS, TEXT_LENGTH_JS, TIMELINE_CHANGED_JS, WAIT_STATS
+from src.scraper.scraper import (
+    COOKIE_PATH,
+    END_OF_TIMELINE_SCROLLS,
+    EXTRACT_ARTICLES_JS,
+    HARVEST_TIMELINE_JS,
+    TimelineHarvester,
+    build_tweet_data,
+    finish_images,
+    find_article_record,
+    media_ready,
+    queue_images,
+)
+
+# Max tweet ids waiting for a worker; the timeline scroller blocks when it is full
+URL_QUEUE_SIZE = 50
+
+async def wait_for(page, label, expression, arg, timeout):
+    """Async counterpart of the waits.py helpers: resolve when expression is truthy, recorded in WAIT_STATS."""
+    try:
+        with WAIT_STATS.measure(label):
+            await page.wait_for_function(expression, arg=arg, timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+async def expand_show_more(el):
+    """Async twin of scraper.expand_show_more."""
+    while True:
+        buttons = el.locator("div[role=button]:has-text('Show more'), div[role=button]:has-text('显示更多')")
+        if await buttons.count() > 0:
+            try:
+                before = await el.evaluate(TEXT_LENGTH_JS)
+                await buttons.first.click(timeout=2000)
+                await wait_for(el.page, "show_more", TEXT_EXPANDED_JS, [await el.element_handle(), before], 5000)
+            except Exception as e:
+                print(f"⚠️ Could not click 'Show more': {e}")
+                break
+        else:
+            break
+
+async def scrape_tweet_page(page, tweet_id):
+    """Open a tweet page on a reusable worker page and map it into tweet_data."""
+    url = scraper.canonical_tweet_url(tweet_id)
+    await asyncio.sleep(RATE_LIMITER.reserve(url))
+    await page.goto(url)
+    await page.wait_for_selector("article", timeout=10000)
+    records = await page.evaluate(EXTRACT_ARTICLES_JS)
+
+    target_idx, target = find_article_record(records, tweet_id)
+    if target is None:
+        target_idx, target = 0, records[0]
+    if target["showMore"] or (target["quoted"] and target["quoted"]["showMore"]):
+        await expand_show_more(page.locator("article").nth(target_idx))
+        records = await page.evaluate(EXTRACT_ARTICLES_JS)
+    return build_tweet_data(records, tweet_id)
+
+class PoolStats:
+    """Counters for the end-of-run throughput report."""
+
+    def __init__(self, workers):
+        self.started = time.monotonic()
+        self.per_worker = [0] * workers
+        self.failed = 0
+        self.stored = 0
+        self.queued = 0
+        self.handled = 0
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        scraped = sum(self.per_worker)
+        rate = scraped / elapsed if elapsed else 0.0
+        print("=" * 50)
+        print(f"Scraped {scraped} tweets ({self.failed} failed), stored {self.stored} in {elapsed:.1f}s")
+        print(f"Throughput: {rate:.2f} tweets/s ({rate * 60:.1f} tweets/min)")
+        for n, count in enumerate(self.per_worker):
+            print(f"  worker {n}: {count} tweets")
+        print("=" * 50)
+
+async def scroll_timeline(page, url_queue, writer, start_date, end_date, stats):
+    """Harvest the timeline and queue tweet ids in range that are not yet in the DB."""
+    harvester = TimelineHarvester()
+    stalled = 0
+    while True:
+        entries = harvester.accept(await page.evaluate(HARVEST_TIMELINE_JS))
+        print(f"Scrolling: Found {len(entries)} new tweets on page.")
+        for tweet_id, dt, _ in entries:
+            # claim(): skip ids already stored or queued earlier in this run
+            if not (start_date <= dt.date() <= end_date) or not writer.claim(tweet_id):
+                continue
+            stats.queued += 1
+            await url_queue.put((tweet_id, 0))
+        if harvester.all_before(start_date):
+            print(f"🛑 All tweets on this page are before {start_date}. Stopping.")
+            return
+        await page.keyboard.press("PageDown")
+        if await wait_for(page, "scroll", TIMELINE_CHANGED_JS, harvester.marker, 8000) or entries:
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= END_OF_TIMELINE_SCROLLS:
+                print(f"🛑 Nothing more loaded after {stalled} scrolls. Stopping.")
+                return
+
+async def detail_worker(n, context, url_queue, result_queue, collector, worker_delay, stats, block_resources):
+    """Drain url_queue on one reusable page, pushing tweet_data to result_queue."""
+    page = await context.new_page()
+    if block_resources:
+        await install_route_filter(page, ROUTE_PROFILES["detail"])
+    try:
+        while True:
+            item = await url_queue.get()
+            try:
+                if item is None:
+                    return
+                tweet_id, depth = item
+                tweet_data = collector.get(tweet_id) if collector else None
+                if tweet_data is None:
+                    tweet_data = await scrape_tweet_page(page, tweet_id)
+                    if worker_delay:
+                        await asyncio.sleep(worker_delay)
+                # Media downloads in the background; the writer waits for them, not the worker
+                queue_images(tweet_data)
+                stats.per_worker[n] += 1
+                await result_queue.put((tweet_data, depth))
+            except Exception as e:
+                stats.failed += 1
+                print(f"[worker {n}] Failed to scrape tweet {item[0]}: {e}")
+            finally:
+                if item is not None:
+                    stats.handled += 1
+                url_queue.task_done()
+    finally:
+        await page.close()
+
+async def download_image_with_context(context, img_url):
+    """Async twin of scraper.download_image_with_playwright (context.request fallback)."""
+    await asyncio.sleep(RATE_LIMITER.reserve(img_url))
+    response = await context.request.get(img_url, timeout=10000)
+    RATE_LIMITER.observe(img_url, response.status, response.headers)
+    if response.ok:
+        return await response.body()
+    print(f"Playwright request for image failed with status {response.status}")
+    return None
+
+async def feed_frontier(frontier, wakeup, url_queue, stats):
+    """Move related tweet ids from the frontier to the workers' queue, best first."""
+    while True:
+        item = frontier.pop()
+        if item is None:
+            wakeup.clear()
+            await wakeup.wait()
+            continue
+        stats.queued += 1
+        await url_queue.put(item)
+
+async def db_writer(context, writer, result_queue, frontier, wakeup, stats):
+    """Single consumer that stores every result and puts the tweets it quotes or replies to on the frontier."""
+    while True:
+        tweet_data, depth = await result_queue.get()
+        try:
+            while not media_ready(tweet_data):
+                await MEDIA.pump_async(lambda url: download_image_with_context(context, url))
+                await asyncio.sleep(0.1)
+            finish_images(tweet_data)
+            writer.add(tweet_data)
+            stats.stored += 1
+            if frontier.push_related(tweet_data, depth):
+                wakeup.set()
+        except Exception as e:
+            print(f"DB error: {e}")
+        finally:
+            result_queue.task_done()
+
+async def run_pool_scraper(user, start_date, end_date, workers=4, worker_delay=0.0, source="dom",
+                           block_resources=True, rate=1.0, media_variant=None, related_depth=MAX_RELATED_DEPTH,
+                           prefer="quotes"):
+    """Scrape a user timeline with `workers` concurrent tweet pages in one browser context.
+
+    Requires saved cookies (see scraper.ensure_cookies). The pool neither reads nor
+    writes crawl checkpoints: it always scrolls the whole range.
+    """
+    scraper.START_DATE = start_date
+    scraper.END_DATE = end_date
+    scraper.TWITTER_USER = user
+    MEDIA.variant = media_variant
+
+    session = SessionLocal()
+    writer = TweetWriter(session)
+    checkpoint = CrawlCheckpointer(session, user, start_date, end_date)
+    if checkpoint.done or checkpoint.frontier:
+        print(f"⚠️ {len(checkpoint.done)} days of {start_date}..{end_date} are already done and "
+              f"{len(checkpoint.frontier)} related tweets are queued from an earlier run, but --workers "
+              f"does not resume: the whole range is scrolled and the saved frontier is ignored. "
+              f"Run without --workers to resume.")
+    stats = PoolStats(workers)
+    url_queue = asyncio.Queue(maxsize=URL_QUEUE_SIZE)
+    result_queue = asyncio.Queue()
+    frontier = RelatedFrontier(writer.claim, max_depth=related_depth, prefer=prefer)
+    frontier_wakeup = asyncio.Event()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=False)
+        context = await browser.new_context(storage_state=json.loads(COOKIE_PATH.read_text()))
+        # One limiter budget for all workers, adapted from the pages they navigate to
+        RATE_LIMITER.configure("x.com", rate)
+        context.on("response", RATE_LIMITER.observe_response)
+
+        collector = None
+        if source == "graphql":
+            collector = GraphQLCollector()
+            collector.attach(context)
+
+        page = await context.new_page()
+        if block_resources:
+            await install_route_filter(page, ROUTE_PROFILES["timeline"])
+        url = scraper.timeline_url(user)
+        await asyncio.sleep(RATE_LIMITER.reserve(url))
+        await page.goto(url)
+        try:
+            with WAIT_STATS.measure("articles"):
+                await page.wait_for_selector("article[role='article']", timeout=15000)
+        except PlaywrightTimeoutError:
+            print("⚠️ No tweet articles after 15000ms")
+
+        worker_tasks = [
+            asyncio.create_task(detail_worker(n, context, url_queue, result_queue, collector, worker_delay, stats,
+                                        block_resources))
+            for n in range(workers)
+        ]
+        writer_task = asyncio.create_task(db_writer(context, writer, result_queue, frontier, frontier_wakeup, stats))
+        feeder_task = asyncio.create_task(feed_frontier(frontier, frontier_wakeup, url_queue, stats))
+
+        try:
+            await scroll_timeline(page, url_queue, writer, start_date, end_date, stats)
+            # The writer may queue related tweets after the workers went idle, so loop until all settle
+            while True:
+                await url_queue.join()
+                await result_queue.join()
+                if stats.handled == stats.queued and not frontier:
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            feeder_task.cancel()
+            for _ in worker_tasks:
+                await url_queue.put(None)
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+            writer_task.cancel()
+            await browser.close()
+            writer.close()
+            session.close()
+            stats.report()
+            frontier.report()
+            WAIT_STATS.report()
@@ -0,0 +1,149 @@
+import email.utils
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+# twitter.com and x.com (and their www./api./mobile. hosts) share one budget
+X_HOSTS = ("x.com", "twitter.com")
+
+# Browser requests that go through reserve()/acquire(): page navigations. The XHRs
+# (GraphQL), scripts and images a page loads on its own are not paced, and their
+# rate-limit headers describe their own endpoint's budget, so they are not observed.
+PACED_RESOURCE_TYPES = ("document",)
+
+def host_key(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    if any(host == h or host.endswith("." + h) for h in X_HOSTS):
+        return "x.com"
+    return host
+
+def _retry_after_seconds(value, now):
+    """Parse a Retry-After header (delta seconds or HTTP date); None if missing or malformed."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - now
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, seconds) if math.isfinite(seconds) else None
+
+def _reset_time(value):
+    """Parse an x-rate-limit-reset header (epoch seconds); None if missing or malformed."""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    return reset if math.isfinite(reset) else None
+
+class TokenBucket:
+    """Token bucket that hands out reservations: reserve() returns how long to wait."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class HostLimit:
+    def __init__(self, rate, burst, max_rate):
+        self.base_rate = rate
+        self.max_rate = max_rate
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0.0  # wall-clock time.time()
+        self.strikes = 0
+
+class RateLimiter:
+    """Per-host adaptive token buckets shared by Playwright navigations and image downloads.
+
+    observe() feeds back response statuses and X's rate-limit headers: a 429/503 halves
+    the host's rate and pauses it (Retry-After, x-rate-limit-reset or exponential
+    backoff); `x-rate-limit-remaining: 0` pauses until the reset; successes slowly
+    raise the rate back up to max_rate. Browser responses only count for the requests
+    the limiter paces (see observe_response).
+    """
+
+    DEFAULT_LIMITS = {
+        "x.com": (1.0, 2),
+        "pbs.twimg.com": (8.0, 8),
+    }
+    FALLBACK_LIMIT = (5.0, 5)
+    MIN_RATE = 0.05
+    MAX_BACKOFF = 900.0
+    RECOVERY = 1.05
+
+    def __init__(self, limits=None):
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def configure(self, host, rate, burst=None):
+        """Set the steady-state rate (requests/second) for a host key."""
+        with self.lock:
+            self.limits[host] = (rate, burst or max(1, round(rate * 2)))
+            self.hosts.pop(host, None)
+
+    def _host(self, key) -> HostLimit:
+        state = self.hosts.get(key)
+        if state is None:
+            rate, burst = self.limits.get(key, self.FALLBACK_LIMIT)
+            state = self.hosts[key] = HostLimit(rate, burst, max_rate=rate * 2)
+        return state
+
+    def reserve(self, url) -> float:
+        """Take a token for url's host; return the seconds the caller must wait first."""
+        with self.lock:
+            state = self._host(host_key(url))
+            delay = state.bucket.reserve(time.monotonic())
+            return max(delay, state.paused_until - time.time())
+
+    def acquire(self, url) -> float:
+        """Blocking reserve(): sleep until the request may go out."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def observe(self, url, status, headers):
+        """Adapt the host's rate to one response."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        key = host_key(url)
+        reset = _reset_time(headers.get("x-rate-limit-reset"))
+        with self.lock:
+            state = self._host(key)
+            bucket = state.bucket
+            if status in (429, 503):
+                state.strikes += 1
+                bucket.rate = max(self.MIN_RATE, bucket.rate / 2)
+                pause = _retry_after_seconds(headers.get("retry-after"), now)
+                if pause is None and reset is not None:
+                    pause = max(0.0, reset - now)
+                if pause is None:
+                    pause = min(self.MAX_BACKOFF, 2.0 ** state.strikes)
+                state.paused_until = max(state.paused_until, now + pause)
+                print(f"⚠️ {key} answered {status}; backing off {pause:.0f}s at {bucket.rate:.2f} req/s")
+            elif headers.get("x-rate-limit-remaining") == "0" and reset is not None:
+                if reset > state.paused_until:
+                    state.paused_until = reset
+                    print(f"⚠️ {key} rate-limit window exhausted; pausing {reset - now:.0f}s")
+            elif 200 <= status < 400:
+                state.strikes = 0
+                bucket.rate = min(state.max_rate, bucket.rate * self.RECOVERY)
+
+    def observe_response(self, response):
+        """Playwright 'response' event handler (sync and async API) for paced navigations."""
+        if response.request.resource_type not in PACED_RESOURCE_TYPES:
+            return
+        self.observe(response.url, response.status, response.headers)
+
+RATE_LIMITER = RateLimiter()
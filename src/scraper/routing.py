@@ -0,0 +1,92 @@
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+# Third-party and X telemetry hosts that never contribute DOM or tweet JSON
+TELEMETRY_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "ads-twitter.com",
+    "ads-api.twitter.com",
+    "ads-api.x.com",
+    "analytics.twitter.com",
+    "static.ads-twitter.com",
+)
+
+@dataclass(frozen=True)
+class RouteProfile:
+    """Which requests a scraping page may skip: Playwright resource types and host suffixes."""
+    name: str
+    blocked_resource_types: frozenset
+    blocked_hosts: tuple
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = urlsplit(url).hostname or ""
+        return any(host == h or host.endswith("." + h) for h in self.blocked_hosts)
+
+# Media is fetched separately with requests, so pages only need documents, scripts and XHR.
+# The timeline keeps its live connections; a single tweet page does not need them either.
+ROUTE_PROFILES = {
+    "timeline": RouteProfile(
+        name="timeline",
+        blocked_resource_types=frozenset({"image", "media", "font", "manifest", "texttrack"}),
+        blocked_hosts=TELEMETRY_HOSTS + ("video.twimg.com",),
+    ),
+    "detail": RouteProfile(
+        name="detail",
+        blocked_resource_types=frozenset({"image", "media", "font", "manifest", "texttrack", "eventsource", "websocket"}),
+        blocked_hosts=TELEMETRY_HOSTS + ("video.twimg.com",),
+    ),
+}
+
+def install_route_filter(target, profile: RouteProfile):
+    """Abort requests matched by profile on a page or context.
+
+    Works with both Playwright APIs; async callers must await the return value.
+    """
+    def handle(route, request):
+        if profile.should_block(request.resource_type, request.url):
+            return route.abort()
+        return route.continue_()
+    return target.route("**/*", handle)
+
+def benchmark_route_filter(browser, storage_state, url, profile, selector="article", timeout=30000):
+    """Load url in fresh contexts with the filter off and on.
+
+    Returns {"off": {...}, "on": {...}} with the bytes and requests transferred
+    until `selector` appears, and how many seconds that took.
+    """
+    results = {}
+    for mode in ("off", "on"):
+        context = browser.new_context(storage_state=storage_state)
+        page = context.new_page()
+        if mode == "on":
+            install_route_filter(page, profile)
+        stats = {"bytes": 0, "requests": 0, "failed": 0}
+
+        def on_finished(request):
+            sizes = request.sizes()
+            stats["bytes"] += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+            stats["requests"] += 1
+
+        def on_failed(request):
+            stats["failed"] += 1
+
+        page.on("requestfinished", on_finished)
+        page.on("requestfailed", on_failed)
+        started = time.monotonic()
+        page.goto(url, wait_until="commit")
+        page.wait_for_selector(selector, timeout=timeout)
+        stats["time_to_article"] = time.monotonic() - started
+        results[mode] = stats
+        context.close()
+    return results
+
+def print_benchmark(label, results):
+    print(f"--- {label} ---")
+    for mode, stats in results.items():
+        print(f"filter {mode:>3}: {stats['bytes'] / 1024:9.1f} KiB in {stats['requests']:4d} requests "
+              f"({stats['failed']} blocked/failed), time-to-article {stats['time_to_article']:.2f}s")
@@ -1,26 +1,41 @@
 
-from src.db.models import Tweet
+from src.db.models import Tweet, normalize_username
 
 import re
+from urllib.parse import quote
 
 import argparse
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 import datetime
 from pathlib import Path
 import os
 import time
-import requests
 from sqlalchemy.orm import Session
 import json
 from pathlib import Path
-import uuid
-from src.db.session import SessionLocal
-from src.db.crud import store_tweet
+from src.db.session import SessionLocal, dispose_engine, make_session_factory
+from src.db.crud import TweetWriter
+from src.scraper.graphql import GraphQLCollector, is_tweet_payload_url
+from src.scraper.waits import (
+    TEXT_LENGTH_JS,
+    WAIT_STATS,
+    expect_response,
+    wait_for_articles,
+    wait_for_text_expansion,
+    wait_for_timeline_change,
+)
+from src.scraper.checkpoint import CrawlCheckpointer, days_between
+from src.scraper.frontier import MAX_RELATED_DEPTH, RELATED_FIELDS, RelatedFrontier
+from src.scraper.media import MEDIA, MEDIA_VARIANTS, upgrade_media
+from src.scraper.ratelimit import RATE_LIMITER
+from src.scraper.routing import ROUTE_PROFILES, benchmark_route_filter, install_route_filter, print_benchmark
 from dotenv import load_dotenv
 load_dotenv()
 
-IMAGES_DIR = Path("images")
-IMAGES_DIR.mkdir(exist_ok=True)
+# Extra seconds to pause after each tweet page visit (per worker), on top of RATE_LIMITER pacing
+WORKER_DELAY = 0.0
+# Abort fonts/media/images/telemetry on scraping pages (see src/scraper/routing.py)
+BLOCK_RESOURCES = True
 
 # --- Config from environment or hardcoded ---
 TWITTER_USER = os.environ.get("TWITTER_TARGET_HANDLE", "TARGET_USERNAME")
@@ -39,6 +54,14 @@ else:
     START_DATE = END_DATE
 
 # --- URL & ID helpers ---
+def timeline_url(user: str, start_date=None, end_date=None) -> str:
+    """Profile timeline URL, or a date-bounded latest-search URL when dates are given."""
+    if start_date is None or end_date is None:
+        return f"https://twitter.com/{user}"
+    until = end_date + datetime.timedelta(days=1)  # search `until:` is exclusive
+    query = quote(f"from:{user} since:{start_date.isoformat()} until:{until.isoformat()}")
+    return f"https://twitter.com/search?q={query}&src=typed_query&f=live"
+
 def canonical_tweet_url(tweet_id: str) -> str:
     """Always return the canonical tweet URL (no /history, /photo, etc.)."""
     return f"https://twitter.com/i/web/status/{tweet_id}"
@@ -53,29 +76,90 @@ def extract_status_id(href: str):
     # strip any extra path segment like /photo/N, /video/N, /history, etc.
     tail = tail.split("/", 1)[0]
     return tail if re.fullmatch(r"\d+", tail) else None
- # Helper to download image with Playwright context if requests fails
-def download_image_with_playwright(context, img_url, img_path):
-     try:
-         new_page = context.new_page()
-         response = new_page.goto(img_url, wait_until='networkidle', timeout=10000)
-         if response and response.ok:
-             content = response.body()
-             with open(img_path, "wb") as f:
-                 f.write(content)
-             new_page.close()
-             return True
-         else:
-             new_page.close()
-             return False
-     except Exception as e:
-         print(f"Playwright backup image download failed: {e}")
-         return False
-         
+
+# Status ids are snowflakes: (milliseconds since TWITTER_EPOCH_MS) << 22 | worker/sequence bits.
+# Ids below FIRST_SNOWFLAKE_ID are the sequential ids used before November 2010.
+TWITTER_EPOCH_MS = 1288834974657
+FIRST_SNOWFLAKE_ID = 29700859247
+# Max disagreement between an id's time and its article's <time> before warning
+TIME_CROSSCHECK_SECONDS = 60
+
+def snowflake_time(tweet_id):
+    """UTC creation time encoded in a status id, or None if it is not a snowflake."""
+    try:
+        value = int(tweet_id)
+    except (TypeError, ValueError):
+        return None
+    if value < FIRST_SNOWFLAKE_ID:
+        return None
+    return datetime.datetime.fromtimestamp(((value >> 22) + TWITTER_EPOCH_MS) / 1000, tz=datetime.timezone.utc)
+
+def snowflake_date(tweet_id):
+    """Local date of snowflake_time(tweet_id), as compared with START_DATE/END_DATE."""
+    created = snowflake_time(tweet_id)
+    return created.astimezone().date() if created else None
+
+def snowflake_id_range(start_date, end_date):
+    """(lowest, highest) status id a tweet posted on local dates [start_date, end_date] can have."""
+    start = datetime.datetime.combine(start_date, datetime.time.min).astimezone()
+    end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min).astimezone()
+    return ((int(start.timestamp() * 1000) - TWITTER_EPOCH_MS) << 22,
+            ((int(end.timestamp() * 1000) - TWITTER_EPOCH_MS) << 22) - 1)
+
+# Image fallback when requests fails: the context's APIRequestContext shares the browser's
+# cookies and connections, so auth-gated media loads without opening a page per image
+def download_image_with_playwright(context, img_url):
+    try:
+        RATE_LIMITER.acquire(img_url)
+        response = context.request.get(img_url, timeout=10000)
+        RATE_LIMITER.observe(img_url, response.status, response.headers)
+        if response.ok:
+            return response.body()
+        print(f"Playwright request for image failed with status {response.status}")
+        return None
+    except Exception as e:
+        print(f"Playwright backup image download failed: {e}")
+        return None
+
+def new_detail_page(context):
+    """Open a page for tweet-detail scraping, with the detail request filter installed."""
+    page = context.new_page()
+    if BLOCK_RESOURCES:
+        install_route_filter(page, ROUTE_PROFILES["detail"])
+    return page
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Twitter Scraper")
     parser.add_argument("--user", type=str, required=True, help="Twitter username to scrape (without @)")
     parser.add_argument("--start-date", type=str, required=True, help="Start date YYYY-MM-DD")
     parser.add_argument("--end-date", type=str, required=True, help="End date YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of concurrent tweet-page workers (1 = sequential scraper)")
+    parser.add_argument("--worker-delay", type=float, default=0.0,
+                        help="Extra seconds each worker pauses after a tweet page")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Starting x.com navigations per second; adapts to 429s and rate-limit headers")
+    parser.add_argument("--shard", choices=["day", "week"],
+                        help="Split the date range into day/week windows scraped by parallel processes")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of shard processes (default: CPU count)")
+    parser.add_argument("--no-block", action="store_true",
+                        help="Load fonts, images, media and analytics on scraping pages (filtered by default)")
+    parser.add_argument("--benchmark-routes", action="store_true",
+                        help="Compare bytes and time-to-article with the request filter off and on, then exit")
+    parser.add_argument("--source", choices=["dom", "graphql"], default="dom",
+                        help="dom: scrape every tweet page; graphql: use intercepted timeline JSON, visiting tweet pages only as fallback")
+    parser.add_argument("--related-depth", type=int, default=MAX_RELATED_DEPTH,
+                        help="Follow quoted / replied-to tweets this many hops from timeline tweets (0 = none)")
+    parser.add_argument("--prefer", choices=list(RELATED_FIELDS), default="quotes",
+                        help="Fetch quoted tweets or replied-to tweets first at each depth")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Scrape the whole range even if earlier runs checkpointed some of its days")
+    parser.add_argument("--media-variant", choices=MEDIA_VARIANTS,
+                        help="Download pbs images as this size variant (default: whatever the page shows)")
+    parser.add_argument("--upgrade-media", action="store_true",
+                        help="Re-fetch stored images of the user's tweets in the date range that are below "
+                             "--media-variant, then exit (no scraping)")
     return parser.parse_args()
 
 def expand_show_more(el):
@@ -83,8 +167,9 @@ def expand_show_more(el):
         buttons = el.locator("div[role=button]:has-text('Show more'), div[role=button]:has-text('显示更多')")
         if buttons.count() > 0:
             try:
+                before = el.evaluate(TEXT_LENGTH_JS)
                 buttons.first.click(timeout=2000)
-                time.sleep(1.5)
+                wait_for_text_expansion(el, before)
             except Exception as e:
                 print(f"⚠️ Could not click 'Show more': {e}")
                 break
@@ -101,166 +186,276 @@ def parse_quoted_tweet_id(article) -> str:
         pass
     return None
 
-def scrape_single_tweet(page, tweet_url, session):
-    """Scrape detailed tweet data by opening tweet page."""
+# --- In-page extraction ---
+# Runs inside the browser and returns one plain record per <article> on the page,
+# so a tweet page costs a single evaluate() roundtrip instead of one IPC call per
+# locator/attribute read.
+EXTRACT_ARTICLES_JS = r"""
+() => {
+    const statusId = (href) => {
+        if (!href || href.indexOf('/status/') === -1) return null;
+        let tail = href.slice(href.indexOf('/status/') + '/status/'.length);
+        tail = tail.split('?')[0].split('/')[0];
+        return /^\d+$/.test(tail) ? tail : null;
+    };
+    const idsIn = (root) => Array.from(root.querySelectorAll("a[href*='/status/']"))
+        .map((a) => statusId(a.getAttribute('href')))
+        .filter(Boolean);
+    const textIn = (root) => {
+        const node = root.querySelector("div[data-testid='tweetText']");
+        return node ? node.innerText.trim() : '';
+    };
+    const mediaIn = (root) => Array.from(root.querySelectorAll('img'))
+        .map((img) => img.getAttribute('src'))
+        .filter((src) => src && src.includes('media'));
+    const timesIn = (root) => Array.from(root.querySelectorAll('time')).map((t) => {
+        const anchor = t.closest("a[href*='/status/']");
+        return {datetime: t.getAttribute('datetime'), statusId: anchor ? statusId(anchor.getAttribute('href')) : null};
+    });
+    const showMoreIn = (root) => Array.from(root.querySelectorAll('div[role=button]'))
+        .some((b) => /Show more|显示更多/.test(b.textContent || ''));
+    const replyingToIn = (root) => {
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        let node;
+        while ((node = walker.nextNode())) {
+            if (node.nodeValue.includes('Replying to')) return idsIn(node.parentElement);
+        }
+        return null;
+    };
+    return Array.from(document.querySelectorAll('article')).map((art) => {
+        const userLink = art.querySelector("a[href^='/']");
+        const userIdEl = Array.from(art.querySelectorAll('[data-user-id]'))
+            .find((el) => /^\d+$/.test(el.getAttribute('data-user-id') || ''));
+        const qa = art.querySelector("div[aria-label='Quoted Tweet'] article, div[aria-label='引用的推文'] article");
+        return {
+            statusIds: idsIn(art),
+            times: timesIn(art),
+            text: textIn(art),
+            showMore: showMoreIn(art),
+            replyingTo: replyingToIn(art),
+            media: mediaIn(art),
+            userHref: userLink ? userLink.getAttribute('href') : null,
+            userId: userIdEl ? userIdEl.getAttribute('data-user-id') : null,
+            quoted: qa ? {
+                statusIds: idsIn(qa),
+                text: textIn(qa),
+                media: mediaIn(qa),
+                showMore: showMoreIn(qa),
+            } : null,
+        };
+    });
+}
+"""
+
+def extract_articles(page):
+    """Return the per-article records produced by EXTRACT_ARTICLES_JS."""
+    return page.evaluate(EXTRACT_ARTICLES_JS)
+
+def parse_tweet_time(time_str):
+    """Parse an X `<time datetime>` value into a local-time datetime."""
+    if not time_str:
+        return None
+    return datetime.datetime.fromisoformat(time_str.replace("Z", "+00:00")).astimezone()
+
+def tweet_time(tweet_id, time_str=None):
+    """Local-time creation time of a tweet: decoded from its id, with the DOM `<time>` as a
+    cross-check (and as the fallback for pre-snowflake ids)."""
+    created = snowflake_time(tweet_id)
+    shown = parse_tweet_time(time_str)
+    if created is None:
+        return shown
+    if shown is not None and abs((shown - created).total_seconds()) > TIME_CROSSCHECK_SECONDS:
+        print(f"⚠️ Tweet {tweet_id}: id says {created.isoformat()}, page shows {shown.isoformat()}; using the id")
+    return created.astimezone()
+
+def find_article_record(records, my_id):
+    """Return (index, record) of the article that links to my_id, or (None, None)."""
+    for idx, rec in enumerate(records):
+        if my_id in rec["statusIds"]:
+            return idx, rec
+    return None, None
+
+def build_tweet_data(records, my_id):
+    """Map the extracted article records of a tweet page into a tweet_data dict.
+
+    `image_urls`/`quoted_image_urls` hold the remote media srcs; callers replace
+    them with local paths once the images are downloaded.
+    """
+    target_idx, article = find_article_record(records, my_id)
+    # Fallback: if not found, use the first article to avoid crashing, but log it
+    if article is None:
+        print(f"⚠️ Could not match article by id {my_id}; using first article as fallback.")
+        article = records[0]
+
+    main_text = article["text"]
+
+    # --- created_at: decoded from the id, cross-checked against the <time> under its own permalink ---
+    own_times = [t for t in article["times"] if t["statusId"] == my_id]
+    time_rec = own_times[0] if own_times else (article["times"][0] if article["times"] else None)
+    created_at = tweet_time(my_id, time_rec["datetime"] if time_rec else None)
+
+    username = TWITTER_USER
+    if article["userHref"]:
+        username = article["userHref"].strip("/")
+    user_id = article["userId"]
+    if not user_id:
+        user_id = None if username.isdigit() else username
+
+    # --- Quoted Tweet Detection ---
+    quoted_tweet_id = None
+    quoted_text = ""
+    quoted_image_srcs = []
+    quoted = article["quoted"]
+    if quoted:
+        quoted_text = quoted["text"]
+        quoted_image_srcs = quoted["media"]
+        for cid in quoted["statusIds"]:
+            if cid != my_id:
+                quoted_tweet_id = cid
+                print(f"Found QUOTED_TWEET_ID: {quoted_tweet_id}")
+                break
+    else:
+        # Fallback: X sometimes merges the quoted block into the main article without labeled container
+        # 1) Try to split visible text by markers
+        raw_text = article["text"]
+        split_mark = None
+        for m in ["\nQuote\n", "Quote", "引用"]:
+            if m in raw_text:
+                split_mark = m
+                break
+        if split_mark:
+            parts = raw_text.split(split_mark, 1)
+            main_text = parts[0].strip()
+            quoted_text = parts[1].strip()
+        # 2) From anchors inside the article, pick any other status id as the quote candidate,
+        #    preferring an ID that has its own <time> scoped under its anchor
+        alt_ids = list(dict.fromkeys(cid for cid in article["statusIds"] if cid != my_id))
+        if alt_ids:
+            timed_ids = {t["statusId"] for t in article["times"]}
+            quoted_tweet_id = next((cid for cid in alt_ids if cid in timed_ids), alt_ids[0])
+            print(f"Found QUOTED_TWEET_ID via fallback: {quoted_tweet_id}")
+
+    # --- Robust Reply Detection: Only if "Replying to" block exists ---
+    in_reply_to_tweet_id = None
+    for rid in article["replyingTo"] or []:
+        if rid != my_id:
+            in_reply_to_tweet_id = rid
+            print(f"Found REPLY via Replying to block: {in_reply_to_tweet_id}")
+            break
+    # --- Fallback Reply Detection: nearest previous article on the page ---
+    if in_reply_to_tweet_id is None and target_idx is not None:
+        for prev in reversed(records[:target_idx]):
+            if not prev["times"]:
+                continue
+            parent_id = next((pid for pid in prev["statusIds"] if pid != my_id), None)
+            if parent_id:
+                in_reply_to_tweet_id = parent_id
+                print(f"Fallback REPLY via preceding article: {in_reply_to_tweet_id}")
+                break
+
+    # Main image srcs exclude quoted ones
+    main_image_srcs = [u for u in article["media"] if u not in quoted_image_srcs]
+
+    return {
+        "tweet_id": my_id,
+        "user_id": user_id or "unknown",
+        "username": username,
+        "text": main_text or article["text"],
+        "created_at": created_at,
+        "in_reply_to_tweet_id": in_reply_to_tweet_id,
+        "quoted_tweet_id": quoted_tweet_id,
+        "image_urls": main_image_srcs,
+        "quoted_image_urls": quoted_image_srcs,
+        "quoted_text": quoted_text,
+        "has_video": False,
+    }
+
+def queue_images(tweet_data):
+    """Start background downloads of tweet_data's remote images without waiting for them.
+
+    The futures are kept under tweet_data["media_futures"] until finish_images().
+    Images are stored content-addressed by MEDIA, so media shared between tweets
+    (e.g. a quoted tweet's pictures) is downloaded and kept only once.
+    """
+    def submit_all(urls):
+        futures = []
+        for img_url in urls:
+            if not isinstance(img_url, str):
+                continue
+            if not (img_url.startswith("http://") or img_url.startswith("https://")):
+                print(f"Skipping non-URL image path: {img_url}")
+                continue
+            futures.append(MEDIA.submit(img_url))
+        return futures
+
+    tweet_data["media_futures"] = {
+        "image_urls": submit_all(tweet_data.get("image_urls", [])),
+        "quoted_image_urls": submit_all(tweet_data.get("quoted_image_urls", [])),
+    }
+    return tweet_data
+
+def media_ready(tweet_data):
+    """True once every download queued for tweet_data has finished."""
+    return all(f.done() for futures in tweet_data.get("media_futures", {}).values() for f in futures)
+
+def playwright_fallback(context):
+    """MEDIA.pump() callback downloading through the browser context (None if there is none)."""
+    if context is None:
+        return None
+    return lambda url: download_image_with_playwright(context, url)
+
+def finish_images(tweet_data, context=None):
+    """Wait for the queued downloads and replace the remote image urls with local paths."""
+    media_futures = tweet_data.pop("media_futures", None)
+    if media_futures is None:
+        return tweet_data
+    MEDIA.wait([f for futures in media_futures.values() for f in futures], playwright_fallback(context))
+    for key, futures in media_futures.items():
+        # Do NOT keep failed downloads (None) or any invalid path
+        tweet_data[key] = [f.result() for f in futures if f.result()]
+    tweet_data["image_paths"] = ",".join(tweet_data["image_urls"])
+    return tweet_data
+
+# Browser-fallback downloads run per scroll iteration, at most this many at a time
+FALLBACK_BATCH = 8
+
+def store_finished_tweets(pending, writer, context, wait=False):
+    """Hand the pending tweets whose images are downloaded (all of them when wait=True) to writer."""
+    MEDIA.pump(playwright_fallback(context), max_jobs=FALLBACK_BATCH)
+    remaining = []
+    for tweet_data in pending:
+        if not wait and not media_ready(tweet_data):
+            remaining.append(tweet_data)
+            continue
+        finish_images(tweet_data, context)
+        writer.add(tweet_data)
+        print(f"Processed tweet {tweet_data['tweet_id']}")
+    pending[:] = remaining
+    writer.tick()
+
+def scrape_single_tweet(page, tweet_url):
+    """Scrape detailed tweet data by opening tweet page.
+
+    Quoted / replied-to tweets are not followed here; callers queue them on a RelatedFrontier.
+    """
+    RATE_LIMITER.acquire(tweet_url)
     page.goto(tweet_url)
     try:
         page.wait_for_selector("article", timeout=10000)
-        # Identify the article that actually corresponds to this tweet_id (my_id)
         my_id = extract_status_id(tweet_url) or tweet_url.split("/status/")[-1].split("?")[0]
-        articles = page.locator("article")
-        target_article = None
-        for idx in range(articles.count()):
-            cand = articles.nth(idx)
-            anchors = cand.locator("a[href*='/status/']")
-            matched = False
-            for a in anchors.all():
-                href = a.get_attribute("href")
-                sid = extract_status_id(href)
-                if sid and sid == my_id:
-                    matched = True
-                    break
-            if matched:
-                target_article = cand
-                break
-        # Fallback: if not found, use the first article to avoid crashing, but log it
-        if target_article is None:
-            print(f"⚠️ Could not match article by id {my_id}; using first article as fallback.")
-            target_article = articles.first
-
-        # Work only within the matched article
-        article = target_article
-        expand_show_more(article)
-
-        # --- PATCH: Robust main text extraction ---
-        main_text_nodes = article.locator("div[data-testid='tweetText']")
-        main_text = main_text_nodes.nth(0).inner_text().strip() if main_text_nodes.count() > 0 else ""
-
-        # --- Extract created_at (tweet timestamp) early ---
-        created_at = None
-        time_el = article.locator(f"a[href*='/status/{my_id}'] time").first
-        if time_el.count() == 0:
-            time_el = article.locator("time").first
-        if time_el.count() > 0:
-            time_str = time_el.get_attribute("datetime")
-            created_at = datetime.datetime.fromisoformat(time_str.replace("Z", "+00:00")).astimezone()
-
-        # --- Extract user_id early ---
-        username = TWITTER_USER
-        user_link = article.locator("a[href^='/']").first
-        if user_link:
-            user_href = user_link.get_attribute("href")
-            if user_href:
-                username = user_href.strip("/")
-
-        user_id = None
-        user_id_elements = article.locator("[data-user-id]")
-        for idx in range(user_id_elements.count()):
-            candidate = user_id_elements.nth(idx)
-            value = candidate.get_attribute("data-user-id")
-            if value and value.isdigit():
-                user_id = value
-                break
-        if not user_id:
-            user_id = None if username.isdigit() else username
-
-        # --- Quoted Tweet Detection ---
-        quoted_tweet_id = None
-        quoted_text = ""
-        quoted_article = article.locator("div[aria-label='Quoted Tweet'] article, div[aria-label='引用的推文'] article")
-        if quoted_article.count() > 0:
-            qa = quoted_article.first
-            expand_show_more(qa)
-            # Quoted text & images
-            q_text_nodes = qa.locator("div[data-testid='tweetText']")
-            quoted_text = q_text_nodes.nth(0).inner_text().strip() if q_text_nodes.count() > 0 else ""
-            q_imgs = qa.locator("img").all()
-            quoted_image_srcs = [img.get_attribute("src") for img in q_imgs if img.get_attribute("src") and "media" in img.get_attribute("src")]
-            # Quoted id
-            q_anchors = qa.locator("a[href*='/status/']")
-            for a in q_anchors.all():
-                href = a.get_attribute("href")
-                cid = extract_status_id(href)
-                if cid and cid != my_id:
-                    quoted_tweet_id = cid
-                    print(f"Found QUOTED_TWEET_ID: {quoted_tweet_id}")
-                    break
-        else:
-            # Fallback: X sometimes merges the quoted block into the main article without labeled container
-            # 1) Try to split visible text by markers
-            main_text_nodes = article.locator("div[data-testid='tweetText']")
-            raw_text = main_text_nodes.nth(0).inner_text().strip() if main_text_nodes.count() > 0 else ""
-            split_mark = None
-            for m in ["\nQuote\n", "Quote", "引用"]:
-                if m in raw_text:
-                    split_mark = m
-                    break
-            if split_mark:
-                parts = raw_text.split(split_mark, 1)
-                main_text = parts[0].strip()
-                quoted_text = parts[1].strip()
-            # 2) From anchors inside the article, pick any other status id as the quote candidate
-            alt_ids = set()
-            all_anchors = article.locator("a[href*='/status/']")
-            for a in all_anchors.all():
-                href = a.get_attribute("href")
-                cid = extract_status_id(href)
-                if cid and cid != my_id:
-                    alt_ids.add(cid)
-            if alt_ids and not quoted_tweet_id:
-                # Prefer an ID that has its own <time> scoped under its anchor
-                picked = None
-                for cid in alt_ids:
-                    t_candidate = article.locator(f"a[href*='/status/{cid}'] time").first
-                    if t_candidate and t_candidate.count() > 0:
-                        picked = cid
-                        break
-                quoted_tweet_id = picked or next(iter(alt_ids))
-                print(f"Found QUOTED_TWEET_ID via fallback: {quoted_tweet_id}")
-
-        # --- Robust Reply Detection: Only if "Replying to" block exists ---
-        in_reply_to_tweet_id = None
-        reply_block = article.locator(":text('Replying to')").first
-        if reply_block and reply_block.count() > 0:
-            reply_anchors = reply_block.locator("a[href*='/status/']")
-            for a in reply_anchors.all():
-                href = a.get_attribute("href")
-                rid = extract_status_id(href)
-                if rid and rid != my_id:
-                    in_reply_to_tweet_id = rid
-                    print(f"Found REPLY via Replying to block: {in_reply_to_tweet_id}")
-                    break
-        # --- Fallback Reply Detection: nearest previous article on the page ---
-        if in_reply_to_tweet_id is None:
-            try:
-                all_articles = page.locator("article")
-                target_idx = None
-                # Find index of current article
-                for idx2 in range(all_articles.count()):
-                    cand = all_articles.nth(idx2)
-                    anchors2 = cand.locator("a[href*='/status/']")
-                    if any(extract_status_id(a.get_attribute("href")) == my_id for a in anchors2.all()):
-                        target_idx = idx2
-                        break
-                if target_idx is not None:
-                    for j in range(target_idx - 1, -1, -1):
-                        prev_art = all_articles.nth(j)
-                        prev_time_el = prev_art.locator("time").first
-                        if prev_time_el.count() == 0:
-                            continue
-                        prev_anchors = prev_art.locator("a[href*='/status/']")
-                        parent_id = None
-                        for a in prev_anchors.all():
-                            pid = extract_status_id(a.get_attribute("href"))
-                            if pid and pid != my_id:
-                                parent_id = pid
-                                break
-                        if parent_id:
-                            in_reply_to_tweet_id = parent_id
-                            print(f"Fallback REPLY via preceding article: {in_reply_to_tweet_id}")
-                            break
-            except Exception:
-                pass
+        records = extract_articles(page)
+
+        # Expand truncated text only when the page actually shows a "Show more", then re-read
+        target_idx, target = find_article_record(records, my_id)
+        if target is None:
+            target_idx, target = 0, records[0]
+        if target["showMore"] or (target["quoted"] and target["quoted"]["showMore"]):
+            expand_show_more(page.locator("article").nth(target_idx))
+            records = extract_articles(page)
+
+        tweet_data = build_tweet_data(records, my_id)
+        quoted_tweet_id = tweet_data["quoted_tweet_id"]
+        in_reply_to_tweet_id = tweet_data["in_reply_to_tweet_id"]
 
         # --- LOG what is detected ---
         print(f"Main tweet: {my_id}")
@@ -269,98 +464,8 @@ def scrape_single_tweet(page, tweet_url, session):
         if in_reply_to_tweet_id:
             print(f"Detected REPLY: {in_reply_to_tweet_id}")
 
-        # Calculate tweet date string and per-date image subdirectory
-        tweet_date_str = created_at.strftime("%Y-%m-%d") if created_at else "unknown_date"
-        date_dir = IMAGES_DIR / tweet_date_str
-        date_dir.mkdir(parents=True, exist_ok=True)
-
-        # Collect all image srcs in the article
-        all_imgs = article.locator("img").all()
-        all_image_srcs = [img.get_attribute("src") for img in all_imgs if img.get_attribute("src") and "media" in img.get_attribute("src")]
-        # Quoted image srcs (from earlier, if any)
-        quoted_image_srcs = quoted_image_srcs if 'quoted_image_srcs' in locals() else []
-        # Main image srcs exclude quoted ones
-        main_image_srcs = [u for u in all_image_srcs if u not in quoted_image_srcs]
-
-        tweet_data = {
-            "tweet_id": my_id,
-            "user_id": user_id or "unknown",
-            "username": username,
-            "text": main_text if 'main_text' in locals() and main_text else (article.locator("div[data-testid='tweetText']").nth(0).inner_text().strip() if article.locator("div[data-testid='tweetText']").count() > 0 else ""),
-            "created_at": created_at,
-            "in_reply_to_tweet_id": in_reply_to_tweet_id,
-            "quoted_tweet_id": quoted_tweet_id,
-            "image_urls": [],
-            "has_video": False,
-        }
-
-        # Save ONLY main images to local paths
-        local_image_urls = []
-        for img_url in main_image_srcs:
-            if not isinstance(img_url, str):
-                continue
-            if not (img_url.startswith("http://") or img_url.startswith("https://")):
-                print(f"Skipping non-URL image path: {img_url}")
-                continue
-            filename = f"{tweet_data['tweet_id']}_{uuid.uuid4().hex[:8]}.jpg"
-            img_path = date_dir / filename
-            # Try requests first
-            success = False
-            try:
-                response = requests.get(img_url, timeout=10)
-                if response.status_code == 200 and response.content:
-                    with img_path.open("wb") as img_file:
-                        img_file.write(response.content)
-                    local_image_urls.append(str(img_path))
-                    success = True
-                else:
-                    print(f"requests.get failed with status {response.status_code if response else 'N/A'}")
-            except Exception as e:
-                print(f"⚠️ requests image download failed: {e}")
-
-            # Fallback to Playwright context if not successful
-            if not success:
-                context = page.context
-                backup_success = download_image_with_playwright(context, img_url, img_path)
-                if backup_success:
-                    local_image_urls.append(str(img_path))
-                else:
-                    print(f"⚠️ Failed to download image by any means: {img_url}")
-                    # Do NOT append img_url or any invalid path
-        tweet_data["image_urls"] = local_image_urls
-        tweet_data["image_paths"] = ",".join(local_image_urls)
-
-        # --- Download quoted images, if any ---
-        quoted_local_image_urls = []
-        for qimg_url in quoted_image_srcs:
-            if not isinstance(qimg_url, str):
-                continue
-            if not (qimg_url.startswith("http://") or qimg_url.startswith("https://")):
-                print(f"Skipping non-URL quoted image path: {qimg_url}")
-                continue
-            qfilename = f"{tweet_data['tweet_id']}_quoted_{uuid.uuid4().hex[:8]}.jpg"
-            qimg_path = date_dir / qfilename
-            qsuccess = False
-            try:
-                qresponse = requests.get(qimg_url, timeout=10)
-                if qresponse.status_code == 200 and qresponse.content:
-                    with qimg_path.open("wb") as qimg_file:
-                        qimg_file.write(qresponse.content)
-                    quoted_local_image_urls.append(str(qimg_path))
-                    qsuccess = True
-                else:
-                    print(f"requests.get failed for quoted image with status {qresponse.status_code if qresponse else 'N/A'}")
-            except Exception as e:
-                print(f"⚠️ requests quoted image download failed: {e}")
-            if not qsuccess:
-                context = page.context
-                backup_qsuccess = download_image_with_playwright(context, qimg_url, qimg_path)
-                if backup_qsuccess:
-                    quoted_local_image_urls.append(str(qimg_path))
-                else:
-                    print(f"⚠️ Failed to download quoted image by any means: {qimg_url}")
-        tweet_data["quoted_image_urls"] = quoted_local_image_urls
-        tweet_data["quoted_text"] = quoted_text
+        # Download main and quoted images in the background
+        queue_images(tweet_data)
 
         print("=" * 50)
         print(f"TWEET_ID: {tweet_data.get('tweet_id')}")
@@ -369,64 +474,196 @@ def scrape_single_tweet(page, tweet_url, session):
         print(f"IN_REPLY_TO_TWEET_ID: {tweet_data.get('in_reply_to_tweet_id')}")
         print(f"QUOTED_TWEET_ID: {tweet_data.get('quoted_tweet_id')}")
         print(f"CREATED_AT: {tweet_data.get('created_at')}")
-        print(f"IMAGE_PATHS: {tweet_data.get('image_paths')}")
+        print(f"IMAGES: {len(tweet_data.get('image_urls', []))} queued for download")
         print(f"TEXT:\n{tweet_data.get('text')}")
         print("=" * 50)
 
-        # --- PATCH: Recursively scrape quoted/replied tweet if not in DB ---
-        for related_id in [quoted_tweet_id, in_reply_to_tweet_id]:
-            if related_id and not session.query(Tweet).filter_by(tweet_id=related_id).first():
-                url = canonical_tweet_url(related_id)
-                reply_page = page.context.new_page()
-                reply_data = scrape_single_tweet(reply_page, url, session)
-                reply_page.close()
-                time.sleep(2)
-                if reply_data:
-                    from src.db.crud import store_tweet
-                    store_tweet(reply_data, session, scraper_fn=None)
-                    print(f"Saved quoted/replied tweet {related_id}")
-
         return tweet_data
 
     except Exception as e:
         print(f"Failed to scrape tweet {tweet_url}: {e}")
         return None
 
-def single_pass_scrape(page, session):
-    processed_tweet_ids = set()
+# --- Timeline harvesting ---
+# Returns (id, datetime) for every visible timeline article that has not been
+# harvested yet, plus the (id, datetime) of the newest visible tweet, i.e. the highest
+# status id. Harvested articles are tagged with data-xs-seen so later scrolls skip
+# them in-page; the tag carries the status id because X recycles article nodes while
+# virtualizing the timeline.
+HARVEST_TIMELINE_JS = r"""
+() => {
+    const statusId = (href) => {
+        if (!href || href.indexOf('/status/') === -1) return null;
+        let tail = href.slice(href.indexOf('/status/') + '/status/'.length);
+        tail = tail.split('?')[0].split('/')[0];
+        return /^\d+$/.test(tail) ? tail : null;
+    };
+    // Snowflake ids grow with time: a longer id, or a larger one of the same length, is newer
+    const newer = (a, b) => a.length > b.length || (a.length === b.length && a > b);
+    const fresh = [];
+    let newest = null;
+    const arts = document.querySelectorAll("article[role='article']");
+    for (const art of arts) {
+        const t = art.querySelector('time');
+        if (!t) continue;
+        let id = null;
+        for (const a of art.querySelectorAll('a')) {
+            id = statusId(a.getAttribute('href'));
+            if (id) break;
+        }
+        if (!id) continue;
+        const datetime = t.getAttribute('datetime');
+        if (newest === null || newer(id, newest.id)) newest = {id, datetime};
+        if (art.getAttribute('data-xs-seen') === id) continue;
+        art.setAttribute('data-xs-seen', id);
+        fresh.push({id, datetime});
+    }
+    // same marker as waits.TIMELINE_CHANGED_JS
+    const last = arts[arts.length - 1];
+    const lastArtTime = last && last.querySelector('time') ? last.querySelector('time').getAttribute('datetime') : '';
+    return {fresh, newest, marker: `${arts.length}:${lastArtTime}`};
+}
+"""
+
+class TimelineHarvester:
+    """Incrementally collect (tweet_id, datetime, permalink) from the timeline.
+
+    Each harvest() is one evaluate() call that only returns articles not seen
+    before, so the per-scroll cost does not grow with the DOM.
+    """
+
+    def __init__(self):
+        self.seen_ids = set()
+        self.newest = None
+        self.oldest = None  # oldest tweet harvested so far
+        self.marker = None
+
+    def harvest(self, page):
+        return self.accept(page.evaluate(HARVEST_TIMELINE_JS))
+
+    def accept(self, batch):
+        """Record one HARVEST_TIMELINE_JS result and return the new entries.
+
+        Times come from the status ids (see tweet_time); the DOM `<time>` only cross-checks them.
+        """
+        newest = batch["newest"]
+        self.newest = tweet_time(newest["id"], newest["datetime"]) if newest else None
+        self.marker = batch["marker"]
+        entries = []
+        for item in batch["fresh"]:
+            if item["id"] in self.seen_ids:
+                continue
+            self.seen_ids.add(item["id"])
+            created = tweet_time(item["id"], item["datetime"])
+            if created is not None and (self.oldest is None or created < self.oldest):
+                self.oldest = created
+            entries.append((item["id"], created, canonical_tweet_url(item["id"])))
+        return entries
+
+    def all_before(self, start_date):
+        """True if every tweet visible in the last batch is older than start_date."""
+        return self.newest is None or self.newest.date() < start_date
+
+def fetch_tweet(page, tweet_id, collector=None):
+    """Return tweet_data for tweet_id, from intercepted GraphQL if possible, else its detail page."""
+    if collector:
+        tweet_data = collector.get(tweet_id)
+        if tweet_data:
+            print(f"Using intercepted GraphQL data for tweet {tweet_id}")
+            return queue_images(tweet_data)
+    new_page = new_detail_page(page.context)
+    tweet_data = scrape_single_tweet(new_page, canonical_tweet_url(tweet_id))
+    new_page.close()
+    if WORKER_DELAY:
+        time.sleep(WORKER_DELAY)
+    return tweet_data
+
+def drain_frontier(page, writer, frontier, pending, collector=None):
+    """Fetch every queued related tweet (and, depth permitting, the ones they lead to)."""
     while True:
-        tweet_articles = page.locator("article[role='article']")
-        count = tweet_articles.count()
-        print(f"Scrolling: Found {count} tweets on page.")
+        item = frontier.pop()
+        if item is None:
+            return
+        tweet_id, depth = item
+        try:
+            tweet_data = fetch_tweet(page, tweet_id, collector)
+            if tweet_data:
+                pending.append(tweet_data)
+                frontier.push_related(tweet_data, depth)
+                print(f"Scraped quoted/replied tweet {tweet_id} (depth {depth})")
+            else:
+                frontier.fail(tweet_id, depth)
+        except Exception as e:
+            print(f"Error processing related tweet {tweet_id}: {e}")
+            frontier.fail(tweet_id, depth)
+        except BaseException:
+            # Ctrl-C mid-fetch: keep the id queued so the saved frontier still has it
+            frontier.requeue(tweet_id, depth)
+            raise
+        store_finished_tweets(pending, writer, page.context)
+
+# Scrolls in a row that load nothing before the timeline counts as exhausted
+END_OF_TIMELINE_SCROLLS = 3
+
+# State of the bottom of the timeline: emptyState replaces the articles of a search
+# without results, X's "Something went wrong" footer has a Retry button, and a spinner
+# shows while the next results load
+TIMELINE_END_JS = r"""
+() => ({
+    empty: !!document.querySelector("[data-testid='emptyState']"),
+    retry: [...document.querySelectorAll("button, [role='button']")]
+        .some(b => /^(Retry|重试)$/.test((b.innerText || '').trim())),
+    loading: !!document.querySelector("[data-testid='primaryColumn'] [role='progressbar']"),
+    atBottom: window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2,
+})
+"""
+
+def timeline_ended(page):
+    """True if X shows the real end of the timeline: no results at all, or the bottom of
+    the results with nothing loading, and in neither case an error footer."""
+    state = page.evaluate(TIMELINE_END_JS)
+    return not state["retry"] and (state["empty"] or (state["atBottom"] and not state["loading"]))
+
+def store_checkpoint(page, writer, frontier, pending, checkpoint, days):
+    """Store everything scraped so far, then record days as complete in checkpoint."""
+    store_finished_tweets(pending, writer, page.context, wait=True)
+    writer.flush()
+    if checkpoint is not None:
+        for tweet_id in writer.dropped:
+            checkpoint.record_failure(tweet_id, snowflake_date(tweet_id))
+        checkpoint.mark_done(days, frontier)
+
+def single_pass_scrape(page, writer, frontier, collector=None, checkpoint=None, bounded=False):
+    """Scrape the open timeline for tweets in [START_DATE, END_DATE].
+
+    checkpoint (a CrawlCheckpointer) is told about each day the timeline scrolls past.
+    bounded means the page is a search limited to the date range, so reaching the end
+    of its results (see timeline_ended) completes the whole range; on a profile timeline
+    it only completes the days already scrolled past (X stops serving old profile
+    tweets long before the first). Days with a tweet that failed are left unfinished.
+    """
+    pending = []  # scraped tweets whose images are still downloading
+    try:
+        scroll_and_scrape(page, writer, frontier, pending, collector, checkpoint, bounded)
+    finally:
+        # Also on Ctrl-C or a crash: store what was scraped before the checkpoint is saved
+        store_finished_tweets(pending, writer, page.context, wait=True)
+
+def scroll_and_scrape(page, writer, frontier, pending, collector, checkpoint, bounded):
+    """The scroll loop of single_pass_scrape; scraped tweets wait in pending for their images."""
+    harvester = TimelineHarvester()
+    stalled = 0
+    while True:
+        entries = harvester.harvest(page)
+        print(f"Scrolling: Found {len(entries)} new tweets on page.")
 
         scroll_has_new_tweet = False
 
-        for i in range(count):
-            article = tweet_articles.nth(i)
+        for tweet_id, dt, tweet_url in entries:
             try:
-                # Get timestamp for the article
-                time_el = article.locator("time").first
-                if time_el.count() == 0:
-                    continue
-                time_str = time_el.get_attribute("datetime")
-                dt = datetime.datetime.fromisoformat(time_str.replace("Z", "+00:00")).astimezone()
                 tweet_date = dt.date()
                 article_time_hm = dt.strftime("%H:%M")
 
-                # Extract tweet ID and URL first (avoid logging None)
-                anchors = article.locator("a")
-                tweet_url = None
-                tweet_id = None
-                for a in anchors.all():
-                    href = a.get_attribute("href")
-                    tid = extract_status_id(href)
-                    if tid:
-                        tweet_id = tid
-                        tweet_url = canonical_tweet_url(tweet_id)
-                        break
-                if not tweet_url or not tweet_id:
-                    continue
-
                 # Print debug info for troubleshooting with actual values
                 print(f"Detected tweet {tweet_id} from {tweet_date} at {article_time_hm} with URL {tweet_url}")
 
@@ -438,117 +675,235 @@ def single_pass_scrape(page, session):
                     print(f"Tweet {tweet_id} is newer than END_DATE. Skipping.")
                     continue
 
-                # If already seen in session or database, skip
-                if tweet_id in processed_tweet_ids:
-                    continue
-                existing = session.query(Tweet).filter_by(tweet_id=tweet_id).first()
-                if existing:
-                    processed_tweet_ids.add(tweet_id)
+                # Skip tweets already in the database or scraped earlier in this run
+                if not writer.claim(tweet_id):
                     continue
 
-                # Scrape main tweet in detail
-                new_page = page.context.new_page()
-                tweet_data = scrape_single_tweet(new_page, tweet_url, session)
-                new_page.close()
-                time.sleep(2)
+                # Scrape main tweet in detail; it is stored once its images are downloaded
+                tweet_data = fetch_tweet(page, tweet_id, collector)
                 if tweet_data:
-                    try:
-                        store_tweet(tweet_data, session, scraper_fn=None)
-                        processed_tweet_ids.add(tweet_id)
-                        scroll_has_new_tweet = True
-                        print(f"Processed tweet {tweet_id} from {tweet_date}")
-                    except Exception as e:
-                        print(f"DB error: {e}")
-                        session.rollback()
-
-                    # Now, if quoted_tweet_id or in_reply_to_tweet_id exists and not in DB, process ONE level deep
-                    for field in ["quoted_tweet_id", "in_reply_to_tweet_id"]:
-                        qid = tweet_data.get(field)
-                        if qid and not session.query(Tweet).filter_by(tweet_id=qid).first():
-                            qurl = canonical_tweet_url(qid)
-                            qpage = page.context.new_page()
-                            qdata = scrape_single_tweet(qpage, qurl, session)
-                            qpage.close()
-                            time.sleep(2)
-                            if qdata:
-                                try:
-                                    store_tweet(qdata, session, scraper_fn=None)
-                                    processed_tweet_ids.add(qid)
-                                    print(f"Processed quoted/replied tweet {qid}")
-                                except Exception as e:
-                                    print(f"DB error on quote/reply {qid}: {e}")
-                                    session.rollback()
+                    pending.append(tweet_data)
+                    scroll_has_new_tweet = True
+                    print(f"Scraped tweet {tweet_id} from {tweet_date}")
+                    # Quoted / replied-to tweets are fetched after this scroll's timeline tweets
+                    frontier.push_related(tweet_data, 0)
+                elif checkpoint is not None:
+                    checkpoint.record_failure(tweet_id, tweet_date)
 
             except Exception as e:
-                print(f"Error processing tweet at index {i}: {e}")
+                print(f"Error processing tweet {tweet_id}: {e}")
+                if checkpoint is not None:
+                    # dt is None when the article had no <time>; the id still dates the tweet
+                    checkpoint.record_failure(tweet_id, dt.date() if dt is not None else snowflake_date(tweet_id))
+
+        drain_frontier(page, writer, frontier, pending, collector)
+        store_finished_tweets(pending, writer, page.context)
+
+        # Days newer than every visible tweet have been scrolled past: checkpoint them
+        if checkpoint is not None and harvester.newest is not None:
+            passed = checkpoint.pending_days(harvester.newest.date(), START_DATE, END_DATE)
+            if passed:
+                store_checkpoint(page, writer, frontier, pending, checkpoint, passed)
 
         # Stop if every tweet visible in this batch is older than START_DATE
-        all_before_start = True
-        for j in range(tweet_articles.count()):
-            t_el = tweet_articles.nth(j).locator("time").first
-            if t_el.count() == 0:
-                continue
-            t_str = t_el.get_attribute("datetime")
-            if not t_str:
-                continue
-            t_dt = datetime.datetime.fromisoformat(t_str.replace("Z", "+00:00")).astimezone()
-            if t_dt.date() >= START_DATE:
-                all_before_start = False
-                break
+        all_before_start = harvester.all_before(START_DATE)
         if all_before_start:
             print(f"🛑 All tweets on this page are before {START_DATE}. Stopping.")
+            # No tweets at all only completes the range if X says so (not e.g. a failed load)
+            finished = harvester.newest is not None or timeline_ended(page)
+            store_checkpoint(page, writer, frontier, pending, checkpoint,
+                             days_between(START_DATE, END_DATE) if finished else [])
             break
         if not scroll_has_new_tweet:
             print("No new tweets found in this scroll. Scrolling down...")
         page.keyboard.press("PageDown")
-        time.sleep(2)
-
-def run_scraper(user, start_date, end_date, login_username, login_password):
-    session = SessionLocal()
-    cookie_path = Path("twitter_cookies.json")
+        if wait_for_timeline_change(page, harvester.marker) or entries:
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= END_OF_TIMELINE_SCROLLS:
+                print(f"🛑 Nothing more loaded after {stalled} scrolls. Stopping.")
+                if checkpoint is None or not bounded:
+                    days = []
+                elif timeline_ended(page):
+                    days = days_between(START_DATE, END_DATE)
+                elif harvester.oldest is not None:
+                    # A slow load or an error footer: only days past the oldest result are done
+                    print("⚠️ The search stopped loading before its end; its older days stay unfinished")
+                    days = checkpoint.pending_days(harvester.oldest.date(), START_DATE, END_DATE)
+                else:
+                    days = []
+                store_checkpoint(page, writer, frontier, pending, checkpoint, days)
+                break
 
+COOKIE_PATH = Path("twitter_cookies.json")
+
+def login_and_save_cookies(page, login_username, login_password, cookie_path=COOKIE_PATH):
+    """Log in through the X login form and save the context storage state."""
+    page.goto("https://twitter.com/login")
+    page.wait_for_selector("input[name='text']", timeout=15000)
+    page.fill("input[name='text']", login_username)
+    page.keyboard.press("Enter")
+    page.wait_for_selector("input[name='password']", timeout=15000)
+    page.fill("input[name='password']", login_password)
+    page.keyboard.press("Enter")
+    try:
+        with WAIT_STATS.measure("login"):
+            page.wait_for_url("**/home", timeout=30000)
+    except PlaywrightTimeoutError:
+        print("⚠️ Login did not reach /home; saving cookies anyway.")
+
+    # Save cookies after login
+    storage = page.context.storage_state()
+    cookie_path.write_text(json.dumps(storage))
+    print("Saved cookies to file.")
+
+def ensure_cookies(login_username, login_password, cookie_path=COOKIE_PATH):
+    """Make sure a saved login exists, logging in with a throwaway browser if needed."""
+    if cookie_path.exists():
+        return
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=False)
-        context = None
+        page = browser.new_context().new_page()
+        login_and_save_cookies(page, login_username, login_password, cookie_path)
+        browser.close()
+
+def open_timeline(page, url, collector=None):
+    RATE_LIMITER.acquire(url)
+    if collector:
+        # Harvesting is only useful once the first timeline payload has been intercepted
+        expect_response(page, "timeline_payload", lambda r: is_tweet_payload_url(r.url), lambda: page.goto(url))
+    else:
+        page.goto(url)
+    wait_for_articles(page)
+
+def run_scraper(user, start_date, end_date, login_username, login_password, source="dom", worker_delay=0.0,
+                db_url=None, use_search=False, block_resources=True, rate=1.0, media_variant=None,
+                related_depth=MAX_RELATED_DEPTH, prefer="quotes", resume=True, index=None):
+    """Scrape user's tweets in [start_date, end_date] into the database (db_url, default tweets.db).
+
+    index (a KnownTweetIndex) overrides the ids loaded from that database as already
+    archived, e.g. for a shard database that only receives the new tweets.
+
+    Progress is checkpointed per day (see src/scraper/checkpoint.py). With resume, a
+    rerun over a range that is partly done scrapes only its unfinished days, through
+    date-bounded searches, and first fetches the related tweets left queued last time.
+    """
+    session = (make_session_factory(db_url) if db_url else SessionLocal)()
+    MEDIA.variant = media_variant
+    cookie_path = COOKIE_PATH
 
-        if cookie_path.exists():
-            print("Loading cookies from file...")
-            storage = json.loads(cookie_path.read_text())
-            context = browser.new_context(storage_state=storage)
-        else:
-            context = browser.new_context()
+    try:
+        # The writer is exited last, so buffered tweets are flushed even on Ctrl-C
+        with TweetWriter(session, index=index) as writer, sync_playwright() as p:
+            browser = p.chromium.launch(headless=False)
+            context = None
+
+            if cookie_path.exists():
+                print("Loading cookies from file...")
+                storage = json.loads(cookie_path.read_text())
+                context = browser.new_context(storage_state=storage)
+            else:
+                context = browser.new_context()
+
+            page = context.new_page()
+
+            # If cookies not loaded, perform login and save cookies
+            if not cookie_path.exists():
+                login_and_save_cookies(page, login_username, login_password, cookie_path)
+
+            collector = None
+            if source == "graphql":
+                collector = GraphQLCollector()
+                collector.attach(context)
+
+            # Page navigations feed the adaptive rate limiter
+            RATE_LIMITER.configure("x.com", rate)
+            context.on("response", RATE_LIMITER.observe_response)
+
+            global BLOCK_RESOURCES
+            BLOCK_RESOURCES = block_resources
+            if block_resources:
+                install_route_filter(page, ROUTE_PROFILES["timeline"])
+
+            global START_DATE, END_DATE, TWITTER_USER, WORKER_DELAY
+            TWITTER_USER = user
+            WORKER_DELAY = worker_delay
+
+            checkpoint = CrawlCheckpointer(session, user, start_date, end_date)
+            # Ids are time-ordered, so the known-id index counts the range's archived tweets directly
+            print(f"{writer.index.count_range(*snowflake_id_range(start_date, end_date))} tweets from "
+                  f"{start_date}..{end_date} (any user) already archived")
+            frontier = RelatedFrontier(writer.claim, max_depth=related_depth, prefer=prefer)
+            if resume and (checkpoint.done or checkpoint.frontier):
+                # Only the unfinished days are scraped, each run of them as a date-bounded search
+                restored = frontier.restore(checkpoint.frontier)
+                windows = checkpoint.windows()
+                bounded = True
+                print(f"Resuming: {len(checkpoint.done)} days already done, {restored} related tweets queued, "
+                      f"{len(windows)} date windows left")
+            else:
+                windows = [(start_date, end_date)]
+                bounded = use_search
+            try:
+                if frontier:
+                    pending = []
+                    try:
+                        drain_frontier(page, writer, frontier, pending, collector)
+                    finally:
+                        store_checkpoint(page, writer, frontier, pending, checkpoint, [])
+                for window_start, window_end in windows:
+                    # User timeline, or a date-bounded search that starts at the requested window
+                    open_timeline(page, timeline_url(user, window_start, window_end) if bounded else timeline_url(user),
+                                  collector)
+                    START_DATE, END_DATE = window_start, window_end
+                    single_pass_scrape(page, writer, frontier, collector, checkpoint, bounded)
+            finally:
+                # Ctrl-C or a crash keeps the unfetched related tweets for the next run
+                checkpoint.save(frontier)
+            frontier.report()
+    finally:
+        session.close()
+        if db_url:
+            # A database of its own (a shard): release it so it can be merged and removed
+            dispose_engine(session.get_bind())
+    WAIT_STATS.report()
+
+def run_media_upgrade(user, start_date, end_date, variant):
+    """Upgrade the stored images of user's tweets in [start_date, end_date] to `variant`."""
+    session = SessionLocal()
+    try:
+        tweets = session.query(Tweet).filter(
+            Tweet.username_norm == normalize_username(user),
+            Tweet.created_at >= datetime.datetime.combine(start_date, datetime.time.min),
+            Tweet.created_at < datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min),
+        ).all()
+        updated = upgrade_media(session, tweets, variant)
+        print(f"Upgraded images of {updated} tweets to '{variant}'")
+    finally:
+        session.close()
+        MEDIA.shutdown()
+
+def run_route_benchmark(user, login_username, login_password):
+    """Report bytes and time-to-article for a timeline and a tweet page, filter off vs on."""
+    ensure_cookies(login_username, login_password)
+    storage = json.loads(COOKIE_PATH.read_text())
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=False)
+        url = timeline_url(user)
+        print_benchmark(f"timeline {url}", benchmark_route_filter(browser, storage, url, ROUTE_PROFILES["timeline"]))
 
+        context = browser.new_context(storage_state=storage)
         page = context.new_page()
-
-        # If cookies not loaded, perform login and save cookies
-        if not cookie_path.exists():
-            page.goto("https://twitter.com/login")
-            page.wait_for_selector("input[name='text']", timeout=15000)
-            page.fill("input[name='text']", login_username)
-            page.keyboard.press("Enter")
-            page.wait_for_timeout(2000)
-            page.wait_for_selector("input[name='password']", timeout=15000)
-            page.fill("input[name='password']", login_password)
-            page.keyboard.press("Enter")
-            page.wait_for_timeout(5000)
-
-            # Save cookies after login
-            storage = context.storage_state()
-            cookie_path.write_text(json.dumps(storage))
-            print("Saved cookies to file.")
-
-        # Go to user timeline
-        page.goto(f"https://twitter.com/{user}")
-        page.wait_for_timeout(5000)
-
-        global START_DATE, END_DATE, TWITTER_USER
-        START_DATE = start_date
-        END_DATE = end_date
-        TWITTER_USER = user
-
-        single_pass_scrape(page, session)
-
-    session.close()
+        page.goto(url)
+        page.wait_for_selector("article", timeout=30000)
+        entries = TimelineHarvester().harvest(page)
+        context.close()
+        if entries:
+            tweet_url = entries[0][2]
+            print_benchmark(f"detail {tweet_url}",
+                            benchmark_route_filter(browser, storage, tweet_url, ROUTE_PROFILES["detail"]))
+        browser.close()
 
 if __name__ == "__main__":
     args = parse_args()
@@ -567,4 +922,32 @@ if __name__ == "__main__":
     start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date()
     end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()
 
-    run_scraper(user, start_date, end_date, login_username, login_password)
\ No newline at end of file
+    if args.upgrade_media:
+        if not args.media_variant:
+            print("Error: --upgrade-media needs --media-variant.")
+            exit(1)
+        run_media_upgrade(user, start_date, end_date, args.media_variant)
+    elif args.benchmark_routes:
+        run_route_benchmark(user, login_username, login_password)
+    elif args.shard:
+        from src.scraper.shard import run_sharded
+
+        run_sharded(user, start_date, end_date, login_username, login_password, window=args.shard,
+                    processes=args.processes, source=args.source, worker_delay=args.worker_delay,
+                    block_resources=not args.no_block, rate=args.rate, media_variant=args.media_variant,
+                    related_depth=args.related_depth, prefer=args.prefer, resume=not args.no_resume)
+    elif args.workers > 1:
+        import asyncio
+        from src.scraper.pool import run_pool_scraper
+
+        ensure_cookies(login_username, login_password)
+        asyncio.run(run_pool_scraper(user, start_date, end_date, workers=args.workers,
+                                     worker_delay=args.worker_delay, source=args.source,
+                                     block_resources=not args.no_block, rate=args.rate,
+                                     media_variant=args.media_variant, related_depth=args.related_depth,
+                                     prefer=args.prefer))
+    else:
+        run_scraper(user, start_date, end_date, login_username, login_password,
+                    source=args.source, worker_delay=args.worker_delay, block_resources=not args.no_block,
+                    rate=args.rate, media_variant=args.media_variant, related_depth=args.related_depth,
+                    prefer=args.prefer, resume=not args.no_resume)
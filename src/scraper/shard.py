@@ -0,0 +1,137 @@
+import datetime
+import json
+import multiprocessing
+import sqlite3
+import time
+from pathlib import Path
+
+from src.db.known import KnownTweetIndex, SharedTweetIndex
+from src.db.models import CrawlDay, Tweet
+from src.db.session import SessionLocal, engine
+from src.scraper.checkpoint import completed_days, days_between
+from src.scraper.scraper import ensure_cookies, run_scraper
+
+SHARDS_DIR = Path("shards")
+WINDOW_DAYS = {"day": 1, "week": 7}
+
+def split_date_range(start_date, end_date, window="day"):
+    """Split [start_date, end_date] into consecutive (start, end) windows of a day or a week."""
+    step = datetime.timedelta(days=WINDOW_DAYS[window])
+    windows = []
+    cursor = start_date
+    while cursor <= end_date:
+        window_end = min(cursor + step - datetime.timedelta(days=1), end_date)
+        windows.append((cursor, window_end))
+        cursor = window_end + datetime.timedelta(days=1)
+    return windows
+
+def shard_db_path(user, start_date, end_date) -> Path:
+    return SHARDS_DIR / f"tweets_{user}_{start_date.isoformat()}_{end_date.isoformat()}.db"
+
+def shard_frontier(shard_path):
+    """Related tweets a shard's checkpoint still has queued (or failed), as saved by CrawlCheckpointer."""
+    conn = sqlite3.connect(shard_path)
+    try:
+        rows = conn.execute("SELECT frontier_ids FROM crawl_checkpoints").fetchall()
+    finally:
+        conn.close()
+    return [item for (frontier_ids,) in rows if frontier_ids for item in json.loads(frontier_ids)]
+
+def remove_shard_db(shard_path):
+    """Delete a merged shard database along with its WAL and shared-memory files."""
+    for path in (shard_path, Path(f"{shard_path}-wal"), Path(f"{shard_path}-shm")):
+        path.unlink(missing_ok=True)
+
+def merge_shard_db(shard_path, target_path) -> int:
+    """Copy every tweet (and completed-day checkpoint) of a shard database into the target; return tweets added."""
+    columns = ", ".join(c.name for c in Tweet.__table__.columns)
+    day_columns = ", ".join(c.name for c in CrawlDay.__table__.columns)
+    conn = sqlite3.connect(target_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS shard", (str(shard_path),))
+        with conn:
+            cur = conn.execute(f"INSERT OR IGNORE INTO tweets ({columns}) SELECT {columns} FROM shard.tweets")
+            added = cur.rowcount
+            conn.execute(f"INSERT OR IGNORE INTO crawl_days ({day_columns}) SELECT {day_columns} FROM shard.crawl_days")
+        conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+    return added
+
+def _run_shard(job):
+    """Worker-process entry point: scrape one window into its own shard database.
+
+    Which tweets are already archived comes from the main database (the shard starts
+    empty), and ids claimed by the other shards of the run are skipped as well.
+    """
+    user, start_date, end_date, login_username, login_password, claims, options = job
+    path = shard_db_path(user, start_date, end_date)
+    started = time.monotonic()
+    error = None
+    try:
+        session = SessionLocal()
+        try:
+            index = SharedTweetIndex(KnownTweetIndex.load(session), claims, owner=f"{start_date}..{end_date}")
+        finally:
+            session.close()
+        run_scraper(user, start_date, end_date, login_username, login_password,
+                    db_url=f"sqlite:///{path}", use_search=True, index=index, **options)
+    except Exception as e:
+        error = str(e)
+    return start_date, end_date, path, time.monotonic() - started, error
+
+def run_sharded(user, start_date, end_date, login_username, login_password, window="day", processes=None,
+                resume=True, **options):
+    """Scrape the date range as parallel per-window processes and merge the shards into the main DB.
+
+    Each process launches its own browser with the saved `twitter_cookies.json` storage
+    state; this process only logs in (once, if needed) and merges results. Extra
+    keyword options are passed through to run_scraper. With resume, windows whose days
+    are all checkpointed as complete in the main database are skipped. A shard that
+    failed or still has related tweets queued is merged but kept, and the next run of
+    its window resumes from it.
+    """
+    SHARDS_DIR.mkdir(exist_ok=True)
+    ensure_cookies(login_username, login_password)
+
+    windows = split_date_range(start_date, end_date, window)
+    if resume:
+        session = SessionLocal()
+        try:
+            done = completed_days(session, user, start_date, end_date)
+        finally:
+            session.close()
+        skipped = [w for w in windows if all(day in done for day in days_between(*w))
+                   and not shard_db_path(user, *w).exists()]
+        windows = [w for w in windows if w not in skipped]
+        if skipped:
+            print(f"Skipping {len(skipped)} windows already completed by earlier runs")
+        if not windows:
+            print("Nothing left to scrape in this range.")
+            return 0
+    # spawn, one task per worker: each shard gets a clean interpreter (and Playwright driver) of its own
+    spawn = multiprocessing.get_context("spawn")
+    manager = spawn.Manager()
+    claims = manager.dict()  # tweet id -> window of the shard that claimed it
+    jobs = [(user, s, e, login_username, login_password, claims, options) for s, e in windows]
+    processes = processes or min(len(jobs), multiprocessing.cpu_count())
+    print(f"Sharding {start_date}..{end_date} into {len(jobs)} {window} windows over {processes} processes")
+
+    target_path = engine.url.database
+    total_added = 0
+    with manager, spawn.Pool(processes, maxtasksperchild=1) as pool:
+        for done, (s, e, path, elapsed, error) in enumerate(pool.imap_unordered(_run_shard, jobs), 1):
+            if error:
+                print(f"[{done}/{len(jobs)}] ⚠️ shard {s}..{e} failed after {elapsed:.0f}s: {error}")
+            if not path.exists():
+                continue
+            added = merge_shard_db(path, target_path)
+            total_added += added
+            print(f"[{done}/{len(jobs)}] shard {s}..{e}: merged {added} new tweets in {elapsed:.0f}s")
+            pending = shard_frontier(path)
+            if error or pending:
+                print(f"⚠️ Keeping {path} ({len(pending)} related tweets pending) for the next run")
+            else:
+                remove_shard_db(path)
+    print(f"Sharded scrape finished: {total_added} new tweets merged into {target_path}")
+    return total_added
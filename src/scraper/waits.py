@@ -0,0 +1,101 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# "<article count>:<datetime of the last article>" — changes when a scroll loaded or swapped tweets.
+# HARVEST_TIMELINE_JS returns the same marker so no extra roundtrip is needed before scrolling.
+TIMELINE_CHANGED_JS = r"""
+(prev) => {
+    const arts = document.querySelectorAll("article[role='article']");
+    const last = arts[arts.length - 1];
+    const lastTime = last && last.querySelector('time') ? last.querySelector('time').getAttribute('datetime') : '';
+    return `${arts.length}:${lastTime}` !== prev;
+}
+"""
+
+TEXT_LENGTH_JS = r"""
+(el) => {
+    const node = el.querySelector("div[data-testid='tweetText']");
+    return node ? node.innerText.length : 0;
+}
+"""
+
+# True once the tweet text changed length or no "Show more" button is left
+TEXT_EXPANDED_JS = r"""
+([el, before]) => {
+    const node = el.querySelector("div[data-testid='tweetText']");
+    if ((node ? node.innerText.length : 0) !== before) return true;
+    return !Array.from(el.querySelectorAll('div[role=button]'))
+        .some((b) => /Show more|显示更多/.test(b.textContent || ''));
+}
+"""
+
+class WaitStats:
+    """Per-label latency of event-driven waits, so slow spots show up in the run summary."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.timeouts = Counter()
+
+    @contextmanager
+    def measure(self, label):
+        started = time.monotonic()
+        try:
+            yield
+        except PlaywrightTimeoutError:
+            self.timeouts[label] += 1
+            raise
+        finally:
+            self.samples[label].append(time.monotonic() - started)
+
+    def report(self):
+        if not self.samples:
+            return
+        print("--- wait latency ---")
+        for label, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            p50 = ordered[len(ordered) // 2]
+            print(f"{label:>18}: n={len(samples):4d} total={sum(samples):7.1f}s p50={p50 * 1000:6.0f}ms "
+                  f"max={ordered[-1] * 1000:6.0f}ms timeouts={self.timeouts[label]}")
+
+WAIT_STATS = WaitStats()
+
+def wait_for_articles(page, timeout=15000) -> bool:
+    """Wait until the page renders its first tweet article."""
+    try:
+        with WAIT_STATS.measure("articles"):
+            page.wait_for_selector("article[role='article']", timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        print(f"⚠️ No tweet articles after {timeout}ms")
+        return False
+
+def wait_for_timeline_change(page, marker, timeout=8000) -> bool:
+    """Wait until a scroll added or replaced timeline articles (see TIMELINE_CHANGED_JS)."""
+    try:
+        with WAIT_STATS.measure("scroll"):
+            page.wait_for_function(TIMELINE_CHANGED_JS, arg=marker, timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+def wait_for_text_expansion(el, before, timeout=5000) -> bool:
+    """Wait until a 'Show more' click expanded the tweet text of article locator el."""
+    try:
+        with WAIT_STATS.measure("show_more"):
+            el.page.wait_for_function(TEXT_EXPANDED_JS, arg=[el.element_handle(), before], timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+def expect_response(page, label, predicate, action, timeout=15000) -> bool:
+    """Run action() and wait until a response matching predicate lands."""
+    try:
+        with WAIT_STATS.measure(label):
+            with page.expect_response(predicate, timeout=timeout):
+                action()
+        return True
+    except PlaywrightTimeoutError:
+        return False
@@ -0,0 +1,56 @@
+import contextlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+sys.path.insert(0, str(ROOT))
+
+# Set before src.db.session is imported: keep the tests off tweets.db, and give
+# src.scraper.scraper the credentials it reads at import time
+os.environ["XSCRAPER_DB_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="xscraper-tests-"), "tweets.db")
+os.environ.setdefault("TWITTER_USERNAME", "test-user")
+os.environ.setdefault("TWITTER_PASSWORD", "test-password")
+
+@pytest.fixture
+def browser():
+    """A headless Chromium, or skip when Playwright's browser is not installed."""
+    from playwright.sync_api import Error, sync_playwright
+
+    with sync_playwright() as p:
+        try:
+            browser = p.chromium.launch(headless=True)
+        except Error as e:
+            pytest.skip(f"Chromium not available: {e.message.splitlines()[0]}")
+        try:
+            yield browser
+        finally:
+            browser.close()
+
+@contextlib.contextmanager
+def count_statements(engine):
+    """Collect the SQL statements engine executes inside the block."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def get(app, url, **headers):
+    """Dispatch a GET through the app; (status, body, headers). Flask 2.3's test client breaks on Werkzeug 3.1."""
+    with app.test_request_context(url, headers=headers):
+        response = app.full_dispatch_request()
+        response.direct_passthrough = False
+        return response.status_code, response.get_data(), response.headers
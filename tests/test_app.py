@@ -0,0 +1,137 @@
+import base64
+import datetime
+import json
+
+import pytest
+
+from conftest import count_statements, get
+import src.app as app_module
+from src import derivatives
+from src.app import app, decode_cursor, encode_cursor
+from src.db.models import Tweet
+from src.db.session import SessionLocal, engine
+
+def test_cursor_round_trip():
+    created = datetime.datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor([created, "123"]), 2) == [created, "123"]
+    assert decode_cursor(encode_cursor([-1.5, created, "123"]), 3) == [-1.5, created, "123"]
+
+def test_tampered_cursors_fall_back_to_the_first_page():
+    for values, size in [
+        (["2020-01-01T00:00:00", {"a": 1}], 2),
+        (["2020-01-01T00:00:00", 123], 2),
+        (["not a date", "123"], 2),
+        (["2020-01-01T00:00:00", "123"], 3),
+        (["best", "2020-01-01T00:00:00", "123"], 3),
+        ([True, "2020-01-01T00:00:00", "123"], 3),
+        ([[1], "2020-01-01T00:00:00", "123"], 3),
+    ]:
+        assert decode_cursor(encode_cursor(values), size) is None, values
+    assert decode_cursor("not base64!", 2) is None
+    assert decode_cursor(base64.urlsafe_b64encode(b'{"a": 1}').decode(), 2) is None
+
+@pytest.fixture(scope="module")
+def archive():
+    """Tweets of @pager, each quoting one tweet and replying to another, in the app's database."""
+    start = datetime.datetime(2023, 1, 1)
+    session = SessionLocal()
+    for n in range(120):
+        session.add(Tweet(tweet_id=str(1650000000000000000 + n), user_id="p", username="pager",
+                          text=f"page tweet {n}", created_at=start + datetime.timedelta(hours=n),
+                          quoted_tweet_id=str(1640000000000000000 + n),
+                          in_reply_to_tweet_id=str(1630000000000000000 + n)))
+        for base, kind in ((1640000000000000000, "quoted"), (1630000000000000000, "parent")):
+            session.add(Tweet(tweet_id=str(base + n), user_id="o", username="other", text=f"{kind} {n}",
+                              created_at=start - datetime.timedelta(days=1, hours=n)))
+    session.commit()
+    session.close()
+
+@pytest.mark.parametrize("path", ["/search", "/search.json"])
+def test_search_pages_cost_the_same_statements_at_any_size(archive, path):
+    counts = {}
+    for page_size in (10, 100):
+        with count_statements(engine) as statements:
+            status, body, _ = get(app, f"{path}?username=pager&match=exact&page_size={page_size}")
+        assert status == 200
+        assert body.count(b"page tweet ") == page_size
+        if path == "/search":
+            assert body.count(b"parent ") == page_size
+        counts[page_size] = len(statements)
+    # The page, its quoted tweets and its reply parents, however many rows
+    assert counts == {10: 3, 100: 3}
+
+def test_search_next_page_costs_the_same(archive):
+    status, body, _ = get(app, "/search.json?username=pager&match=exact&page_size=10")
+    next_url = json.loads(body)["next"]
+    with count_statements(engine) as statements:
+        status, body, _ = get(app, next_url)
+    assert status == 200
+    assert len(json.loads(body)["tweets"]) == 10
+    assert len(statements) == 3
+
+@pytest.fixture
+def image_dirs(tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    images.mkdir()
+    monkeypatch.setattr(app_module, "IMAGES_DIR", images)
+    monkeypatch.setattr(derivatives, "DERIVATIVES_DIR", tmp_path / "derivatives")
+    return images
+
+SHA_NAME = "ab" * 32
+
+def test_original_images_are_cached_as_immutable(image_dirs):
+    (image_dirs / f"{SHA_NAME}.jpg").write_bytes(b"not really a jpeg")
+    status, _, headers = get(app, f"/images/{SHA_NAME}.jpg")
+    assert status == 200
+    assert f"max-age={app_module.IMAGE_MAX_AGE}" in headers["Cache-Control"]
+    assert "immutable" in headers["Cache-Control"]
+    assert headers["ETag"] == f'"{SHA_NAME}"'
+
+def test_images_revalidate_against_the_sha256_etag(image_dirs):
+    (image_dirs / f"{SHA_NAME}.jpg").write_bytes(b"not really a jpeg")
+    status, _, headers = get(app, f"/images/{SHA_NAME}.jpg", **{"If-None-Match": f'"{SHA_NAME}"'})
+    assert status == 304
+    assert "immutable" in headers["Cache-Control"]
+    status, _, _ = get(app, f"/images/{SHA_NAME}.jpg", **{"If-None-Match": '"stale"'})
+    assert status == 200
+
+def test_images_answer_range_requests(image_dirs):
+    (image_dirs / f"{SHA_NAME}.jpg").write_bytes(b"not really a jpeg")
+    status, body, headers = get(app, f"/images/{SHA_NAME}.jpg", Range="bytes=4-9")
+    assert status == 206
+    assert body == b"really"
+    assert headers["Content-Range"] == "bytes 4-9/17"
+    assert "immutable" in headers["Cache-Control"]
+
+def test_original_served_for_a_resize_is_only_cached_briefly(image_dirs):
+    # Undecodable, so ?w= falls back to the original
+    (image_dirs / f"{SHA_NAME}.jpg").write_bytes(b"not really a jpeg")
+    status, body, headers = get(app, f"/images/{SHA_NAME}.jpg?w=320", Accept="image/webp,*/*")
+    assert status == 200
+    assert body == b"not really a jpeg"
+    assert f"max-age={app_module.FALLBACK_MAX_AGE}" in headers["Cache-Control"]
+    assert "immutable" not in headers["Cache-Control"]
+    assert "Accept" in headers["Vary"]
+
+@pytest.mark.skipif(not derivatives.available(), reason="Pillow not installed")
+def test_resized_copies_are_cached_as_immutable(image_dirs):
+    from PIL import Image
+
+    Image.new("RGB", (800, 600), "red").save(image_dirs / f"{SHA_NAME}.png")
+    status, body, headers = get(app, f"/images/{SHA_NAME}.png?w=320", Accept="image/webp,*/*")
+    assert status == 200
+    assert headers["Content-Type"] == "image/webp"
+    assert f"max-age={app_module.IMAGE_MAX_AGE}" in headers["Cache-Control"]
+    assert "immutable" in headers["Cache-Control"]
+    assert "Accept" in headers["Vary"]
+
+def test_search_results_escape_tweet_text():
+    session = SessionLocal()
+    session.add(Tweet(tweet_id="1660000000000000000", user_id="x", username="markup",
+                      created_at=datetime.datetime(2023, 6, 1), text="<img src=x onerror=alert(1)>\nline two"))
+    session.commit()
+    session.close()
+    status, body, _ = get(app, "/search?username=markup&match=exact")
+    assert status == 200
+    assert b"<img src=x" not in body
+    assert b"&lt;img src=x onerror=alert(1)&gt;<br>line two" in body
@@ -0,0 +1,124 @@
+import datetime
+
+import pytest
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+import src.scraper.scraper as scraper
+from src.db.crud import TweetWriter
+from src.db.models import Tweet
+from src.db.session import make_session_factory
+from src.scraper.checkpoint import CrawlCheckpointer, completed_days
+from src.scraper.frontier import RelatedFrontier
+
+def status_id(day, hour=12):
+    """A snowflake id posted at hour:00 local time on day."""
+    return str(scraper.snowflake_id_range(day, day)[0] + ((hour * 3600 * 1000) << 22))
+
+def batch(*tweet_ids):
+    items = [{"id": tweet_id, "datetime": None} for tweet_id in tweet_ids]
+    return {"fresh": items, "newest": items[0] if items else None, "marker": f"{len(items)}:{tweet_ids[-1:]}"}
+
+class FakeTimelinePage:
+    """Sync stand-in for a timeline page: each harvest returns the next batch, then the
+    last one again with nothing new; scrolls never load anything. end describes the
+    bottom of the page as TIMELINE_END_JS reports it."""
+
+    context = None
+
+    def __init__(self, batches, **end):
+        self.batches = list(batches)
+        self.last = None
+        self.keyboard = self
+        self.end = dict({"empty": False, "retry": False, "loading": False, "atBottom": True}, **end)
+        self.scrolls = 0
+
+    def evaluate(self, expression):
+        if expression == scraper.TIMELINE_END_JS:
+            return self.end
+        if self.batches:
+            self.last = self.batches.pop(0)
+            return self.last
+        return dict(self.last, fresh=[])
+
+    def press(self, key):
+        self.scrolls += 1
+
+    def wait_for_function(self, expression, arg=None, timeout=None):
+        raise PlaywrightTimeoutError("timeline did not change")
+
+@pytest.fixture
+def session(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'crawl.db'}")()
+    yield session
+    session.close()
+
+@pytest.fixture
+def writer(session):
+    with TweetWriter(session, batch_size=1000) as writer:
+        yield writer
+
+def scraped(tweet_id, **related):
+    return dict({"tweet_id": tweet_id, "user_id": "u", "username": "someone", "text": "hi",
+                 "created_at": scraper.tweet_time(tweet_id), "image_urls": [], "quoted_image_urls": []}, **related)
+
+def test_ctrl_c_keeps_scraped_tweets_and_unfetched_related_ids(writer, monkeypatch):
+    day = datetime.date(2024, 5, 1)
+    first, second, quoted = status_id(day, 14), status_id(day, 13), status_id(day, 10)
+    monkeypatch.setattr(scraper, "START_DATE", day)
+    monkeypatch.setattr(scraper, "END_DATE", day)
+
+    def fetch_tweet(page, tweet_id, collector=None):
+        if tweet_id == quoted:
+            raise KeyboardInterrupt
+        return scraped(tweet_id, quoted_tweet_id=quoted if tweet_id == first else None)
+
+    monkeypatch.setattr(scraper, "fetch_tweet", fetch_tweet)
+    frontier = RelatedFrontier(writer.claim)
+    page = FakeTimelinePage([batch(first, second)])
+    with pytest.raises(KeyboardInterrupt):
+        scraper.single_pass_scrape(page, writer, frontier)
+
+    # The tweets scraped before Ctrl-C reached the writer, and the related id being
+    # fetched when it came is queued again for the saved frontier
+    assert list(writer.buffer) == [first, second]
+    assert frontier.snapshot() == [[quoted, 1, "quotes"]]
+
+DAYS = [datetime.date(2024, 5, d) for d in range(1, 6)]
+
+def scrape_window(page, writer, session, monkeypatch, failing=()):
+    """single_pass_scrape of a bounded search over DAYS; returns the days checkpointed as done."""
+    monkeypatch.setattr(scraper, "START_DATE", DAYS[0])
+    monkeypatch.setattr(scraper, "END_DATE", DAYS[-1])
+    monkeypatch.setattr(scraper, "fetch_tweet",
+                        lambda page, tweet_id, collector=None: None if tweet_id in failing else scraped(tweet_id))
+    checkpoint = CrawlCheckpointer(session, "someone", DAYS[0], DAYS[-1])
+    scraper.single_pass_scrape(page, writer, RelatedFrontier(writer.claim), checkpoint=checkpoint, bounded=True)
+    return completed_days(session, "someone", DAYS[0], DAYS[-1])
+
+def test_days_with_failed_fetches_are_not_marked(writer, session, monkeypatch):
+    ids = [status_id(day) for day in reversed(DAYS)]
+    done = scrape_window(FakeTimelinePage([batch(*ids)]), writer, session, monkeypatch, failing={ids[2]})
+    assert done == set(DAYS) - {DAYS[2]}
+    assert session.query(Tweet).count() == 4
+
+def test_reaching_the_end_of_a_search_completes_the_window(writer, session, monkeypatch):
+    page = FakeTimelinePage([batch(status_id(DAYS[4]), status_id(DAYS[3]))])
+    assert scrape_window(page, writer, session, monkeypatch) == set(DAYS)
+
+def test_an_entry_without_a_time_does_not_stop_the_scroll(writer, session, monkeypatch):
+    page = FakeTimelinePage([batch(status_id(DAYS[4]), "not-a-status-id", status_id(DAYS[3]))])
+    assert scrape_window(page, writer, session, monkeypatch) == set(DAYS)
+    assert session.query(Tweet).count() == 2
+
+@pytest.mark.parametrize("end", [{"retry": True}, {"loading": True}, {"atBottom": False}])
+def test_a_stalled_search_only_completes_days_past_its_oldest_result(writer, session, monkeypatch, end):
+    page = FakeTimelinePage([batch(status_id(DAYS[4]), status_id(DAYS[3]))], **end)
+    assert scrape_window(page, writer, session, monkeypatch) == {DAYS[4]}
+
+def test_failed_related_tweets_are_kept_in_the_frontier(writer, monkeypatch):
+    monkeypatch.setattr(scraper, "fetch_tweet", lambda page, tweet_id, collector=None: None)
+    frontier = RelatedFrontier(writer.claim)
+    frontier.push("1800000000000000000", 1)
+    scraper.drain_frontier(FakeTimelinePage([]), writer, frontier, [])
+    assert len(frontier) == 0
+    assert frontier.snapshot() == [["1800000000000000000", 1, "quotes"]]
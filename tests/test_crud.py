@@ -0,0 +1,69 @@
+import datetime
+import subprocess
+import sys
+from concurrent.futures import Future
+from pathlib import Path
+
+from src.db.crud import TweetWriter, store_tweet
+from src.db.models import Tweet
+from src.db.session import make_session_factory
+
+def tweet_data(tweet_id, **overrides):
+    data = {"tweet_id": tweet_id, "user_id": "u", "username": "someone", "text": f"tweet {tweet_id}",
+            "created_at": datetime.datetime(2024, 5, 1, 12), "image_paths": ""}
+    data.update(overrides)
+    return data
+
+def test_flush_writes_new_rows_once(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'crud.db'}")()
+    writer = TweetWriter(session, batch_size=1000)
+    for n in range(5):
+        writer.add(tweet_data(str(n)))
+    writer.add(tweet_data("0"))
+    assert writer.flush() == 5
+    assert writer.flush() == 0
+    assert session.query(Tweet).count() == 5
+    assert not writer.claim("3")
+    session.close()
+
+def test_flush_drops_only_the_rows_the_database_refuses(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'crud.db'}")()
+    writer = TweetWriter(session, batch_size=1000)
+    for n in range(7):
+        # user_id is NOT NULL: rows 2 and 5 fail, and with them their whole batch
+        writer.add(tweet_data(str(n), user_id=None if n in (2, 5) else "u"))
+
+    assert writer.flush() == 5
+    assert writer.buffer == {}
+    assert writer.dropped == {"2", "5"}
+    assert sorted(tid for (tid,) in session.query(Tweet.tweet_id)) == ["0", "1", "3", "4", "6"]
+    # The writer keeps working afterwards
+    writer.add(tweet_data("7"))
+    assert writer.flush() == 1
+    session.close()
+
+class FakePipeline:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, url, fallback=True, variant=None):
+        self.submitted.append(url)
+        future = Future()
+        future.set_result(f"images/{len(self.submitted)}.jpg")
+        return future
+
+def test_store_tweet_downloads_images_through_the_given_pipeline(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'crud.db'}")()
+    media = FakePipeline()
+    quoted = tweet_data("1", image_urls=["https://pbs.twimg.com/media/Q.jpg"])
+    tweet = tweet_data("2", quoted_tweet_id="1", image_urls=["https://pbs.twimg.com/media/A.jpg"])
+    store_tweet(tweet, session, scraper_fn=lambda tweet_id: quoted, media=media)
+    assert media.submitted == ["https://pbs.twimg.com/media/Q.jpg", "https://pbs.twimg.com/media/A.jpg"]
+    assert session.query(Tweet).count() == 2
+    session.close()
+
+def test_the_db_layer_does_not_import_the_scraper():
+    code = "import sys, src.db.crud; print(sorted(m for m in sys.modules if m.startswith('src.scraper')))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).resolve().parent.parent)
+    assert result.stdout.strip() == "[]"
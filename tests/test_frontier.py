@@ -0,0 +1,60 @@
+from src.db.known import KnownTweetIndex
+from src.scraper.frontier import RelatedFrontier
+
+def drain(frontier):
+    items = []
+    while (item := frontier.pop()) is not None:
+        items.append(item)
+    return items
+
+def test_shallowest_first_then_preferred_kind_then_oldest():
+    frontier = RelatedFrontier(KnownTweetIndex().add, max_depth=3, prefer="replies")
+    frontier.push("30", 2, "quotes")
+    frontier.push("10", 1, "quotes")
+    frontier.push("11", 1, "replies")
+    frontier.push("12", 1, "quotes")
+    frontier.push("20", 2, "replies")
+    assert drain(frontier) == [("11", 1), ("10", 1), ("12", 1), ("20", 2), ("30", 2)]
+
+def test_each_id_is_queued_at_most_once_per_run():
+    index = KnownTweetIndex([100])
+    frontier = RelatedFrontier(index.add)
+    assert not frontier.push("100", 1)  # already archived
+    assert frontier.push("200", 1)
+    assert not frontier.push("200", 2)  # already queued
+    assert drain(frontier) == [("200", 1)]
+    assert not frontier.push("200", 1)  # already fetched
+    assert (frontier.pushed, frontier.skipped_known) == (1, 3)
+
+def test_push_related_follows_quotes_and_replies_up_to_max_depth():
+    frontier = RelatedFrontier(KnownTweetIndex().add, max_depth=2)
+    tweet = {"tweet_id": "1", "quoted_tweet_id": "2", "in_reply_to_tweet_id": "3"}
+    assert frontier.push_related(tweet, 0) == 2
+    assert frontier.push_related({"quoted_tweet_id": "4", "in_reply_to_tweet_id": None}, 1) == 1
+    assert frontier.push_related({"quoted_tweet_id": "5"}, 2) == 0
+    assert frontier.skipped_depth == 1
+    assert drain(frontier) == [("2", 1), ("3", 1), ("4", 2)]
+
+def test_snapshot_and_restore_round_trip():
+    frontier = RelatedFrontier(KnownTweetIndex().add)
+    frontier.push("6", 1, "replies")
+    frontier.fail(*frontier.pop())
+    frontier.push("7", 2, "replies")
+    frontier.push("8", 1, "replies")
+    frontier.push("9", 1)
+    frontier.push("5", 2)
+    taken = frontier.pop()
+    frontier.requeue(*taken)
+    saved = frontier.snapshot()
+    assert saved == [["9", 1, "quotes"], ["8", 1, "replies"], ["5", 2, "quotes"], ["7", 2, "replies"],
+                     ["6", 1, "replies"]]
+
+    # A new run restores what it does not know yet, each id as the kind it was found as
+    resumed = RelatedFrontier(KnownTweetIndex([8]).add, prefer="replies")
+    assert resumed.restore(saved) == 4
+    assert drain(resumed) == [("6", 1), ("9", 1), ("7", 2), ("5", 2)]
+
+def test_restore_reads_checkpoints_saved_without_kinds():
+    frontier = RelatedFrontier(KnownTweetIndex().add)
+    assert frontier.restore([["9", 1], ["8", 2]]) == 2
+    assert frontier.snapshot() == [["9", 1, "quotes"], ["8", 2, "quotes"]]
@@ -0,0 +1,106 @@
+import datetime
+import json
+
+import pytest
+
+from conftest import get
+from src.app import app
+from src.db.fts import fts_condition, fts_join_condition, tweets_fts
+from src.db.models import Tweet
+from src.db.session import SessionLocal, make_session_factory
+
+START = datetime.datetime(2022, 6, 1)
+
+@pytest.fixture
+def session(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'fts.db'}")()
+    yield session
+    session.close()
+
+def matches(session, q):
+    condition, _ = fts_condition(q)
+    rows = session.query(Tweet.tweet_id).join(tweets_fts, fts_join_condition(Tweet.tweet_id)).filter(condition)
+    return sorted(tweet_id for (tweet_id,) in rows)
+
+def test_the_index_follows_inserts_updates_and_deletes(session):
+    # The quoting tweet is stored first, as in a batch, and still picks up the quoted text
+    session.add(Tweet(tweet_id="2", user_id="u", username="someone", text="look at this", quoted_tweet_id="1"))
+    session.flush()
+    session.add(Tweet(tweet_id="1", user_id="u", username="someone", text="original elephant"))
+    session.commit()
+    assert matches(session, "elephant") == ["1", "2"]
+    assert matches(session, "look") == ["2"]
+
+    session.get(Tweet, "1").text = "original giraffe"
+    session.commit()
+    assert matches(session, "elephant") == []
+    assert matches(session, "giraffe") == ["1", "2"]
+
+    session.delete(session.get(Tweet, "2"))
+    session.commit()
+    assert matches(session, "giraffe") == ["1"]
+    assert matches(session, "look") == []
+
+def test_short_terms_fall_back_to_like(session):
+    for n, text in enumerate(["你好世界", "世界和平", "hello ab", "a_b"], 1):
+        session.add(Tweet(tweet_id=str(n), user_id="u", username="someone", text=text))
+    session.commit()
+    assert fts_condition("世界")[1] is False
+    assert matches(session, "世界") == ["1", "2"]
+    assert matches(session, "你好 世界") == ["1"]
+    # LIKE wildcards in the term are matched literally
+    assert matches(session, "_b") == ["4"]
+    # Mixed with a long term: MATCH and LIKE together
+    assert fts_condition("hello ab")[1] is True
+    assert matches(session, "hello ab") == ["3"]
+
+@pytest.fixture(scope="module")
+def needles():
+    """Tweets of @ftsuser matching "needle" with few distinct bm25 ranks (so ranks tie across pages)."""
+    session = SessionLocal()
+    for n in range(31):
+        session.add(Tweet(tweet_id=str(1670000000000000000 + n), user_id="f", username="ftsuser",
+                          text=" ".join(["needle"] * (n % 3 + 1) + ["hay"] * 5),
+                          created_at=START + datetime.timedelta(hours=n // 2)))
+    session.add(Tweet(tweet_id="1670000000000000100", user_id="f", username="ftsuser",
+                      text='<script>alert("x")</script> a needle & <b>thread</b>', created_at=START))
+    session.commit()
+    session.close()
+
+def search_json(url):
+    status, body, _ = get(app, url)
+    assert status == 200
+    return json.loads(body)
+
+def test_snippets_escape_the_tweet_text(needles):
+    result = search_json("/search.json?username=ftsuser&match=exact&q=thread")
+    (tweet,) = result["tweets"]
+    snippet = tweet["snippet"]
+    assert "<mark>" in snippet and "thread" in snippet
+    assert "<script>" not in snippet and "<b>" not in snippet
+    assert "&lt;script&gt;" in snippet and "&amp;" in snippet
+
+    status, body, _ = get(app, "/search?username=ftsuser&match=exact&q=thread")
+    assert status == 200
+    assert b"<script>alert" not in body
+
+def test_ranked_pages_follow_bm25_without_duplicates(needles):
+    base = "/search.json?username=ftsuser&match=exact&q=needle"
+    everything = [t["tweet_id"] for t in search_json(base + "&page_size=200")["tweets"]]
+    assert len(everything) == 32
+
+    pages, url = [], base + "&page_size=7"
+    while url:
+        result = search_json(url)
+        pages.append([t["tweet_id"] for t in result["tweets"]])
+        url = result["next"]
+    assert [len(page) for page in pages] == [7, 7, 7, 7, 4]
+    assert sum(pages, []) == everything
+
+    # And back again from the last page
+    back, url = [], result["prev"]
+    while url:
+        result = search_json(url)
+        back.insert(0, [t["tweet_id"] for t in result["tweets"]])
+        url = result["prev"]
+    assert back == pages[:-1]
@@ -0,0 +1,86 @@
+import datetime
+import json
+
+from conftest import FIXTURES
+from src.scraper.graphql import GraphQLCollector, is_tweet_payload_url, iter_tweet_results, parse_tweet_result
+
+USER_TWEETS_URL = "https://x.com/i/api/graphql/V7H0Ap3_Hh2FyS75OCDO3Q/UserTweets"
+
+def load_fixture(name):
+    return json.loads((FIXTURES / name).read_text())
+
+def parsed(name):
+    return {t["tweet_id"]: t for t in map(parse_tweet_result, iter_tweet_results(load_fixture(name)))}
+
+def test_payload_urls():
+    assert is_tweet_payload_url(USER_TWEETS_URL + "?variables=%7B%7D")
+    assert is_tweet_payload_url("https://x.com/i/api/graphql/abc/TweetDetail")
+    assert not is_tweet_payload_url("https://x.com/i/api/graphql/abc/UserByScreenName")
+    assert not is_tweet_payload_url("https://x.com/Mistery5387057/status/1")
+
+def test_note_tweet_text_wins_over_truncated_full_text():
+    tweet = parsed("graphql_user_tweets.json")["1952385648323457024"]
+    assert tweet["text"].startswith("A long post word word word")
+    assert tweet["text"].endswith("end. & more")
+    assert "t.co" not in tweet["text"]
+
+def test_display_text_range_drops_reply_mentions_and_media_links():
+    tweet = parsed("graphql_user_tweets.json")["1952385648323457025"]
+    assert tweet["text"] == "Fish & chips"
+    assert tweet["in_reply_to_tweet_id"] == "1952385000000000000"
+    assert tweet["image_urls"] == ["https://pbs.twimg.com/media/AAA.jpg", "https://pbs.twimg.com/media/BBB.png"]
+    assert tweet["has_video"] is False
+
+def test_quoted_tweet_wrapped_in_visibility_results():
+    tweets = parsed("graphql_user_tweets.json")
+    tweet = tweets["1952385648323457026"]
+    assert tweet["quoted_tweet_id"] == "1900000000000000001"
+    # The quoted tweet itself is nested in the payload and collected too
+    assert tweets["1900000000000000001"]["username"] == "quoted_user"
+    assert tweets["1900000000000000001"]["text"] == "The quoted tweet"
+
+def test_video_flag_and_no_photo_urls_for_video_thumbnails():
+    tweet = parsed("graphql_user_tweets.json")["1952385648323457026"]
+    assert tweet["has_video"] is True
+    assert tweet["image_urls"] == []
+
+def test_created_at_and_user_fields():
+    tweet = parsed("graphql_user_tweets.json")["1952385648323457024"]
+    assert tweet["username"] == "Mistery5387057"
+    assert tweet["user_id"] == "111"
+    assert tweet["created_at"] == datetime.datetime(2025, 8, 4, 15, 6, 26, tzinfo=datetime.timezone.utc)
+    assert tweet["created_at"].tzinfo is not None
+
+def test_collector_ingest_and_get_returns_copy():
+    collector = GraphQLCollector()
+    assert collector.ingest(load_fixture("graphql_tweet_detail.json")) == 2
+    tweet = collector.get("1952385648323457025")
+    tweet["text"] = "changed"
+    assert collector.get("1952385648323457025")["text"] == "Fish & chips"
+    assert collector.get("404") is None
+
+def test_collector_ingests_route_fulfilled_responses(browser):
+    context = browser.new_context()
+    collector = GraphQLCollector()
+    collector.attach(context)
+    page_html = f"""<html><body><script>
+        fetch("{USER_TWEETS_URL}?variables=%7B%7D").then(r => r.text()).then(() => document.title = "done");
+    </script></body></html>"""
+
+    def fulfill(route):
+        if "/graphql/" in route.request.url:
+            route.fulfill(status=200, content_type="application/json",
+                          body=(FIXTURES / "graphql_user_tweets.json").read_text())
+        else:
+            route.fulfill(status=200, content_type="text/html", body=page_html)
+
+    context.route("https://x.com/**", fulfill)
+    page = context.new_page()
+    page.goto("https://x.com/Mistery5387057")
+    page.wait_for_function("document.title === 'done'")
+    page.wait_for_timeout(100)
+    context.close()
+
+    assert set(collector.tweets) == {"1952385648323457024", "1952385648323457025",
+                                     "1952385648323457026", "1900000000000000001"}
+    assert collector.get("1952385648323457025")["text"] == "Fish & chips"
@@ -0,0 +1,150 @@
+import datetime
+import hashlib
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import src.scraper.scraper as scraper
+from src.db.models import MediaBlob, Tweet
+from src.db.session import SessionLocal, make_session_factory, write_queue_for
+from src.scraper.media import MediaPipeline, MediaStore, normalize_media_url, upgrade_media
+from src.scraper.ratelimit import RATE_LIMITER
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\1" * 32
+JPEG = b"\xff\xd8\xff" + b"\2" * 32
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the status named by the path, e.g. /403/a.png."""
+
+    def do_GET(self):
+        self.send_response(int(self.path.split("/")[1]))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def status_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StatusHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        for host in ("127.0.0.1", "localhost"):
+            RATE_LIMITER.hosts.pop(host, None)
+
+def download_with_browser_fallback(pipeline, url):
+    future = pipeline.submit(url)
+    pipeline.wait([future], fallback_fn=lambda _: PNG, poll=0.01)
+    return future.result()
+
+def test_only_auth_failures_mark_a_host_as_browser_only(status_server, tmp_path):
+    pipeline = MediaPipeline(store=MediaStore(root=tmp_path))
+    port = status_server.server_port
+
+    # A server error that the browser retry gets past says nothing about authentication
+    assert download_with_browser_fallback(pipeline, f"http://localhost:{port}/500/a.png")
+    assert pipeline.auth_hosts == set()
+
+    assert download_with_browser_fallback(pipeline, f"http://127.0.0.1:{port}/403/b.png")
+    assert pipeline.auth_hosts == {"127.0.0.1"}
+    pipeline.shutdown()
+
+def test_auth_hosts_skip_plain_http(status_server, tmp_path):
+    pipeline = MediaPipeline(store=MediaStore(root=tmp_path))
+    pipeline.auth_hosts.add("127.0.0.1")
+    fetched = []
+    pipeline.fetch = lambda url: fetched.append(url)
+    assert download_with_browser_fallback(pipeline, f"http://127.0.0.1:{status_server.server_port}/200/c.png")
+    assert fetched == []
+    pipeline.shutdown()
+
+class FakeUpgradePipeline:
+    """Resolves every submit at once to a new file named after the requested variant."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, url, fallback=True, variant=None):
+        self.submitted.append((url, variant))
+        future = Future()
+        future.set_result(f"images/new-{variant}-{len(self.submitted)}.jpg")
+        return future
+
+    def wait(self, futures):
+        pass
+
+def test_upgrade_media_rewrites_paths_through_the_write_queue(tmp_path):
+    session = make_session_factory(f"sqlite:///{tmp_path / 'media.db'}")()
+    session.add_all([
+        MediaBlob(url_key="https://pbs.twimg.com/media/A?format=jpg&name=small", sha256="a", path="images/a.jpg",
+                  variant="small"),
+        MediaBlob(url_key="https://pbs.twimg.com/media/B?format=jpg&name=orig", sha256="b", path="images/b.jpg",
+                  variant="orig"),
+        Tweet(tweet_id="1", user_id="u", username="Someone", image_paths="images/a.jpg,images/b.jpg"),
+        Tweet(tweet_id="2", user_id="u", username="Someone", image_paths="images/b.jpg"),
+    ])
+    session.commit()
+    tweets = session.query(Tweet).order_by(Tweet.tweet_id).all()
+    pipeline = FakeUpgradePipeline()
+
+    assert upgrade_media(session, tweets, "large", pipeline) == 1
+    assert pipeline.submitted == [("https://pbs.twimg.com/media/A?format=jpg&name=small", "large")]
+    # The caller's session has nothing left to commit and sees the writer thread's update
+    assert not session.dirty
+    assert session.get(Tweet, "1").image_paths == "images/new-large-1.jpg,images/b.jpg"
+    assert session.get(Tweet, "2").image_paths == "images/b.jpg"
+    session.close()
+
+def test_run_media_upgrade_matches_the_handle_case_insensitively(monkeypatch):
+    session = SessionLocal()
+    session.add_all([
+        Tweet(tweet_id="9001", user_id="u", username="MixedCase", created_at=datetime.datetime(2024, 5, 1, 12)),
+        Tweet(tweet_id="9002", user_id="v", username="other", created_at=datetime.datetime(2024, 5, 1, 12)),
+    ])
+    session.commit()
+    session.close()
+    seen = []
+    monkeypatch.setattr(scraper, "upgrade_media", lambda session, tweets, variant: seen.extend(tweets) or 0)
+
+    scraper.run_media_upgrade("@mixedcase", datetime.date(2024, 5, 1), datetime.date(2024, 5, 1), "orig")
+    assert [t.tweet_id for t in seen] == ["9001"]
+
+@pytest.fixture
+def media_db(tmp_path):
+    return make_session_factory(f"sqlite:///{tmp_path / 'media.db'}")
+
+def test_identical_bytes_from_two_urls_are_stored_once(tmp_path, media_db):
+    store = MediaStore(root=tmp_path / "images", session_factory=media_db)
+    first = store.put("https://pbs.twimg.com/media/A.jpg", JPEG)
+    second = store.put("https://example.com/copy.jpg", JPEG)
+    sha = hashlib.sha256(JPEG).hexdigest()
+    assert first == second == str(tmp_path / "images" / sha[:2] / sha[2:4] / f"{sha}.jpg")
+    assert [str(p) for p in (tmp_path / "images").rglob("*") if p.is_file()] == [first]
+
+def test_indexed_urls_are_not_fetched_again(tmp_path, media_db):
+    path = MediaStore(root=tmp_path, session_factory=media_db).put("https://pbs.twimg.com/media/A.jpg", JPEG)
+    write_queue_for(media_db.kw["bind"]).run(lambda session: None)  # the index row is written
+
+    pipeline = MediaPipeline(store=MediaStore(root=tmp_path, session_factory=media_db))
+    fetched = []
+    pipeline.fetch = lambda url: fetched.append(url) or (JPEG, 200)
+    assert pipeline.submit("https://pbs.twimg.com/media/A?format=jpg&name=medium").result() == path
+    assert fetched == []
+    pipeline.shutdown()
+
+def test_media_url_variants_share_one_key():
+    key = "https://pbs.twimg.com/media/A?format=jpg&name=medium"
+    for url in ["https://pbs.twimg.com/media/A.jpg",
+                "https://pbs.twimg.com/media/A.jpg?name=medium",
+                "https://pbs.twimg.com/media/A?name=medium&format=jpg",
+                "http://PBS.twimg.com/media/A?format=jpg&name=medium&tag=12"]:
+        assert normalize_media_url(url) == key, url
+    assert normalize_media_url("https://pbs.twimg.com/media/A.jpg?name=small") != key
+    assert normalize_media_url("https://example.com/a.jpg?b=2&a=1") == "https://example.com/a.jpg?a=1&b=2"
@@ -0,0 +1,44 @@
+import asyncio
+import datetime
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from src.scraper.pool import PoolStats, scroll_timeline
+from src.scraper.scraper import END_OF_TIMELINE_SCROLLS
+
+class StalledTimelinePage:
+    """A profile timeline that ran out: one tweet in range, then nothing ever loads."""
+
+    def __init__(self):
+        self.keyboard = self
+        self.batches = [{"fresh": [{"id": "1952385648323457024", "datetime": "2025-08-04T15:06:26.000Z"}],
+                         "newest": {"id": "1952385648323457024", "datetime": "2025-08-04T15:06:26.000Z"},
+                         "marker": "1:2025-08-04T15:06:26.000Z"}]
+        self.scrolls = 0
+
+    async def evaluate(self, expression):
+        if self.batches:
+            return self.batches.pop(0)
+        return {"fresh": [], "newest": {"id": "1952385648323457024", "datetime": "2025-08-04T15:06:26.000Z"},
+                "marker": "1:2025-08-04T15:06:26.000Z"}
+
+    async def press(self, key):
+        self.scrolls += 1
+
+    async def wait_for_function(self, expression, arg=None, timeout=None):
+        raise PlaywrightTimeoutError("timeline did not change")
+
+class ClaimAll:
+    def claim(self, tweet_id):
+        return True
+
+def test_scroll_timeline_stops_when_nothing_more_loads():
+    page = StalledTimelinePage()
+    url_queue = asyncio.Queue()
+    stats = PoolStats(1)
+    asyncio.run(asyncio.wait_for(
+        scroll_timeline(page, url_queue, ClaimAll(), datetime.date(2020, 1, 1), datetime.date(2025, 12, 31), stats),
+        timeout=5))
+    assert url_queue.get_nowait() == ("1952385648323457024", 0)
+    # The first scroll still had new entries; then END_OF_TIMELINE_SCROLLS empty ones
+    assert page.scrolls == END_OF_TIMELINE_SCROLLS + 1
@@ -0,0 +1,118 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from src.scraper.media import MediaPipeline, MediaStore
+from src.scraper.ratelimit import RATE_LIMITER, RateLimiter
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+
+class Stub429Handler(BaseHTTPRequestHandler):
+    """Answers 429 (Retry-After: 1) to the first `limited` requests, then serves a PNG."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(time.monotonic())
+        if len(server.requests) <= server.limited:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub429Handler)
+    server.requests = []
+    server.limited = 1
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    RATE_LIMITER.configure("127.0.0.1", 50.0)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        RATE_LIMITER.hosts.pop("127.0.0.1", None)
+        RATE_LIMITER.limits.pop("127.0.0.1", None)
+
+def test_fetch_backs_off_after_429(stub_server, tmp_path):
+    pipeline = MediaPipeline(store=MediaStore(root=tmp_path))
+    url = f"http://127.0.0.1:{stub_server.server_port}/media/a.png"
+
+    assert pipeline.fetch(url) == (None, 429)
+    state = RATE_LIMITER.hosts["127.0.0.1"]
+    assert state.strikes == 1
+    assert state.bucket.rate == 25.0
+
+    # The next request waits out Retry-After before it goes out
+    assert pipeline.fetch(url) == (PNG, 200)
+    first, second = stub_server.requests
+    assert second - first >= 0.9
+    assert state.strikes == 0
+
+def test_repeated_429s_keep_halving_the_rate(stub_server, tmp_path):
+    stub_server.limited = 3
+    pipeline = MediaPipeline(store=MediaStore(root=tmp_path))
+    url = f"http://127.0.0.1:{stub_server.server_port}/media/b.png"
+    for _ in range(2):
+        assert pipeline.fetch(url) == (None, 429)
+    state = RATE_LIMITER.hosts["127.0.0.1"]
+    assert state.strikes == 2
+    assert state.bucket.rate == 12.5
+    assert state.paused_until > time.time()
+
+def browser_response(url, resource_type, status, headers=None):
+    return SimpleNamespace(url=url, status=status, headers=headers or {},
+                           request=SimpleNamespace(resource_type=resource_type))
+
+def test_only_navigations_adapt_the_x_budget():
+    limiter = RateLimiter()
+    reset = str(int(time.time()) + 600)
+    # A GraphQL endpoint running out of its own budget, or a 429 on it, does not pause x.com
+    limiter.observe_response(browser_response("https://x.com/i/api/graphql/abc/TweetDetail", "fetch", 200,
+                                              {"x-rate-limit-remaining": "0", "x-rate-limit-reset": reset}))
+    limiter.observe_response(browser_response("https://x.com/i/api/graphql/abc/UserTweets", "xhr", 429))
+    assert limiter.reserve("https://x.com/someone") == 0.0
+    assert limiter.hosts["x.com"].strikes == 0
+
+    # Nor do the many successful subresources of one page load undo a strike
+    limiter.observe_response(browser_response("https://x.com/someone/status/1", "document", 429,
+                                              {"retry-after": "30"}))
+    for _ in range(50):
+        limiter.observe_response(browser_response("https://abs.twimg.com/responsive-web/main.js", "script", 200))
+        limiter.observe_response(browser_response("https://x.com/i/api/graphql/abc/TweetDetail", "xhr", 200))
+    state = limiter.hosts["x.com"]
+    assert state.strikes == 1
+    assert state.bucket.rate == 0.5
+    assert limiter.reserve("https://x.com/someone") > 25
+
+@pytest.mark.parametrize("headers", [
+    {"Retry-After": "soon"},
+    {"Retry-After": "Mon, 99 Foo 2024 25:61:00 GMT"},
+    {"Retry-After": "nan", "x-rate-limit-reset": "never"},
+    {"x-rate-limit-reset": "inf"},
+])
+def test_malformed_rate_limit_headers_fall_back_to_backoff(headers):
+    limiter = RateLimiter()
+    before = time.time()
+    limiter.observe("https://x.com/someone", 429, headers)
+    state = limiter.hosts["x.com"]
+    # First strike: 2 ** 1 seconds
+    assert before + 2.0 <= state.paused_until <= time.time() + 2.0
+
+def test_a_malformed_reset_does_not_pause_an_exhausted_window():
+    limiter = RateLimiter()
+    limiter.observe("https://x.com/someone", 200, {"x-rate-limit-remaining": "0", "x-rate-limit-reset": "soon"})
+    assert limiter.hosts["x.com"].paused_until == 0.0
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.app import build_search_query, paginate
+from src.db.models import Tweet
+from src.db.session import make_engine
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = make_engine(f"sqlite:///{tmp_path_factory.mktemp('plan') / 'tweets.db'}")
+    start = datetime.datetime(2024, 1, 1)
+    with Session(engine) as session:
+        session.add_all(Tweet(tweet_id=str(1750000000000000000 + n), user_id=str(n % 40),
+                              username=f"User{n % 40}", text=f"tweet number {n}",
+                              created_at=start + datetime.timedelta(hours=7 * n))
+                        for n in range(2000))
+        session.commit()
+    return engine
+
+def search_plan(engine, **params):
+    """EXPLAIN QUERY PLAN details of the page query a search runs."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with Session(engine) as session:
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            query, sort_keys = build_search_query(session, **params)
+            rows, _, _ = paginate(query, sort_keys, page_size=20)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        assert rows
+        (statement, parameters), = statements
+        return [row[-1] for row in session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+def assert_index_range(plan, index, ordered=True):
+    assert any(detail.startswith(f"SEARCH tweets USING INDEX {index} (") for detail in plan), plan
+    assert not any(detail.startswith("SCAN tweets") for detail in plan), plan
+    if ordered:
+        # Rows come out in (created_at, tweet_id) order straight from the index
+        assert not any("TEMP B-TREE" in detail for detail in plan), plan
+
+def test_exact_username_search_uses_the_username_index(engine):
+    plan = search_plan(engine, username="@User7", match="exact",
+                       start_date=datetime.date(2024, 2, 1), end_date=datetime.date(2024, 6, 30))
+    assert_index_range(plan, "ix_tweets_username_norm_created_at_id")
+
+def test_prefix_username_search_uses_the_username_index(engine):
+    plan = search_plan(engine, username="user1", match="prefix")
+    # Several handles match, so their rows are merged by a sort; only the matches are read
+    assert_index_range(plan, "ix_tweets_username_norm_created_at_id", ordered=False)
+
+def test_date_only_search_uses_the_created_at_index(engine):
+    plan = search_plan(engine, start_date=datetime.date(2024, 2, 1), end_date=datetime.date(2024, 3, 31))
+    assert_index_range(plan, "ix_tweets_created_at_id")
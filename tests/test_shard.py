@@ -0,0 +1,90 @@
+import datetime
+import multiprocessing
+from pathlib import Path
+
+import src.scraper.shard as shard
+from src.db.known import KnownTweetIndex, SharedTweetIndex
+from src.db.models import Tweet
+from src.db.session import SessionLocal, dispose_engine, engine, make_session_factory, write_queue_for
+from src.scraper.checkpoint import CrawlCheckpointer
+
+ARCHIVED_ID = "1700000000000000001"
+
+def claim_all(args):
+    claims, owner, ids = args
+    index = SharedTweetIndex(KnownTweetIndex(), claims, owner)
+    return [tweet_id for tweet_id in ids if index.add(tweet_id)]
+
+def test_shared_index_claims_each_id_for_one_owner_only():
+    ids = [str(1800000000000000000 + n) for n in range(200)]
+    spawn = multiprocessing.get_context("spawn")
+    with spawn.Manager() as manager, spawn.Pool(2) as pool:
+        claims = manager.dict()
+        first, second = pool.map(claim_all, [(claims, "a", ids), (claims, "b", ids)])
+        assert sorted(first + second) == ids
+        assert dict(claims) == {tweet_id: "a" if tweet_id in first else "b" for tweet_id in ids}
+
+def test_shared_index_knows_archived_and_claimed_ids():
+    claims = {}
+    one = SharedTweetIndex(KnownTweetIndex([int(ARCHIVED_ID)]), claims, "one")
+    other = SharedTweetIndex(KnownTweetIndex([int(ARCHIVED_ID)]), claims, "other")
+    assert ARCHIVED_ID in one and not one.add(ARCHIVED_ID)
+    assert one.add("42")
+    assert "42" in other and not other.add("42")
+    assert not one.add("42")
+    assert one.count_range(0, 10 ** 19) == 2
+
+def test_shards_load_the_index_from_the_main_database(monkeypatch):
+    session = SessionLocal()
+    session.merge(Tweet(tweet_id=ARCHIVED_ID, user_id="u", username="someone"))
+    session.commit()
+    session.close()
+    calls = []
+    monkeypatch.setattr(shard, "run_scraper", lambda *args, **kwargs: calls.append(kwargs))
+
+    claims = {"1800000000000000000": "2024-05-01..2024-05-01"}
+    job = ("someone", datetime.date(2024, 5, 2), datetime.date(2024, 5, 2), "login", "password", claims, {})
+    assert shard._run_shard(job)[-1] is None
+
+    (kwargs,) = calls
+    assert kwargs["db_url"].endswith("tweets_someone_2024-05-02_2024-05-02.db")
+    index = kwargs["index"]
+    assert ARCHIVED_ID in index
+    assert "1800000000000000000" in index
+    assert index.add("1800000000000000001")
+    assert claims["1800000000000000001"] == "2024-05-02..2024-05-02"
+
+def test_shard_engines_are_disposed_with_their_writer(tmp_path):
+    factory = make_session_factory(f"sqlite:///{tmp_path / 'shard.db'}")
+    bind = factory.kw["bind"]
+    write_queue = write_queue_for(bind)
+    write_queue.run(lambda session: session.add(Tweet(tweet_id="1", user_id="u", username="someone")))
+    assert write_queue._thread.is_alive()
+    dispose_engine(bind)
+    assert write_queue._thread is None
+
+def test_merged_shards_leave_no_files_behind(tmp_path):
+    path = tmp_path / "shard.db"
+    factory = make_session_factory(f"sqlite:///{path}")
+    session = factory()
+    session.add(Tweet(tweet_id="1700000000000000002", user_id="u", username="someone"))
+    session.commit()
+    assert Path(f"{path}-wal").exists()
+    session.close()
+    dispose_engine(factory.kw["bind"])
+
+    assert shard.merge_shard_db(path, engine.url.database) == 1
+    shard.remove_shard_db(path)
+    assert list(tmp_path.iterdir()) == []
+
+def test_shard_frontier_reads_the_related_tweets_left_queued(tmp_path):
+    path = tmp_path / "shard.db"
+    factory = make_session_factory(f"sqlite:///{path}")
+    session = factory()
+    checkpoint = CrawlCheckpointer(session, "someone", datetime.date(2024, 5, 2), datetime.date(2024, 5, 2))
+    assert shard.shard_frontier(path) == []
+    checkpoint.frontier = [["1800000000000000000", 1, "quotes"]]
+    checkpoint.save()
+    session.close()
+    dispose_engine(factory.kw["bind"])
+    assert shard.shard_frontier(path) == [["1800000000000000000", 1, "quotes"]]
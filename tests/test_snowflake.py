@@ -0,0 +1,47 @@
+import datetime
+import time
+
+import pytest
+
+from src.scraper.scraper import snowflake_date, snowflake_id_range, snowflake_time, tweet_time
+
+UTC = datetime.timezone.utc
+
+@pytest.fixture
+def shanghai(monkeypatch):
+    """Run with local time UTC+8, where local and UTC dates differ for part of the day."""
+    monkeypatch.setenv("TZ", "Asia/Shanghai")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_snowflake_time_decodes_the_id():
+    assert snowflake_time("1952385648323457024") == datetime.datetime(2025, 8, 4, 15, 6, 26, 788000, tzinfo=UTC)
+    assert snowflake_time(1212092628029698048) == datetime.datetime(2019, 12, 31, 19, 26, 16, 771000, tzinfo=UTC)
+
+def test_pre_snowflake_and_invalid_ids_have_no_time():
+    assert snowflake_time("20") is None
+    assert snowflake_time("29700859246") is None
+    assert snowflake_time("abc") is None
+    assert snowflake_time(None) is None
+    assert snowflake_date("20") is None
+
+def test_tweet_time_prefers_the_id_and_falls_back_to_the_page(capsys):
+    assert tweet_time("1952385648323457024", "2025-08-04T15:06:26.000Z") == snowflake_time("1952385648323457024")
+    assert capsys.readouterr().out == ""
+    # A <time> far off (e.g. a retweet's or quoted tweet's) is reported, the id still wins
+    assert tweet_time("1952385648323457024", "2020-01-01T00:00:00.000Z") == snowflake_time("1952385648323457024")
+    assert "using the id" in capsys.readouterr().out
+    assert tweet_time("20", "2006-03-21T20:50:14.000Z") == datetime.datetime(2006, 3, 21, 20, 50, 14, tzinfo=UTC)
+    assert tweet_time("20") is None
+
+def test_dates_and_id_ranges_use_local_days(shanghai):
+    # 19:26 UTC on New Year's Eve is already 2020 in UTC+8
+    assert snowflake_date("1212092628029698048") == datetime.date(2020, 1, 1)
+    low, high = snowflake_id_range(datetime.date(2020, 1, 1), datetime.date(2020, 1, 1))
+    assert low <= 1212092628029698048 <= high
+    assert snowflake_time(low) == datetime.datetime(2019, 12, 31, 16, tzinfo=UTC)
+    assert snowflake_time(high) < datetime.datetime(2020, 1, 1, 16, tzinfo=UTC) <= snowflake_time(high + 1)
+    next_low, _ = snowflake_id_range(datetime.date(2020, 1, 2), datetime.date(2020, 1, 2))
+    assert next_low == high + 1
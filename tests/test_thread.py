@@ -0,0 +1,81 @@
+import datetime
+import json
+
+import pytest
+
+from conftest import count_statements, get
+from src.app import app
+from src.db.models import Tweet
+from src.db.session import SessionLocal, engine
+from src.db.threads import MAX_ANCESTORS, MAX_DEPTH, MAX_REPLIES
+
+BASE = 1500000000000000000
+ANCESTORS = 150  # more than MAX_ANCESTORS
+FANOUT, LEVELS = 3, 7  # 3 + 9 + ... + 3**7 = 3279 replies below the focus tweet
+CHAIN = 80  # a single reply chain deeper than MAX_DEPTH
+FOCUS = str(BASE + ANCESTORS)
+
+@pytest.fixture(scope="module")
+def deep_thread():
+    """A conversation of a few thousand tweets around FOCUS; returns {tweet_id: depth}."""
+    start = datetime.datetime(2022, 1, 1)
+    rows, depths = [], {}
+    ids = iter(range(BASE, BASE + 10 ** 6))
+
+    def add(parent, depth, text=None, **extra):
+        tweet_id = str(next(ids))
+        rows.append(dict(tweet_id=tweet_id, user_id="t", username="threader", text=text or f"thread tweet {tweet_id}",
+                         created_at=start + datetime.timedelta(minutes=len(rows)), in_reply_to_tweet_id=parent,
+                         **extra))
+        depths[tweet_id] = depth
+        return tweet_id
+
+    parent = None
+    for n in range(ANCESTORS):
+        parent = add(parent, n - ANCESTORS)
+    focus = add(parent, 0, text="<script>alert(1)</script>\nsecond line")
+    assert focus == FOCUS
+    quoted = add(None, None)
+    level = [focus]
+    for depth in range(1, LEVELS + 1):
+        level = [add(p, depth, quoted_tweet_id=quoted) for p in level for _ in range(FANOUT)]
+    parent = focus
+    for depth in range(1, CHAIN + 1):
+        parent = add(parent, depth)
+
+    session = SessionLocal()
+    session.bulk_insert_mappings(Tweet, rows)
+    session.commit()
+    session.close()
+    return depths
+
+def test_thread_view_costs_two_statements_at_any_size(deep_thread):
+    counts = {}
+    for limit in (10, MAX_REPLIES):
+        with count_statements(engine) as statements:
+            status, body, _ = get(app, f"/thread/{FOCUS}.json?limit={limit}")
+        assert status == 200
+        page = json.loads(body)
+        assert page["more_replies"]
+        counts[limit] = len(statements)
+
+        depths = [t["depth"] for t in page["tweets"]]
+        assert depths[:MAX_ANCESTORS + 1] == list(range(-MAX_ANCESTORS, 1))
+        replies = [t for t in page["tweets"] if t["depth"] > 0]
+        assert len(replies) == limit
+        assert max(t["depth"] for t in replies) <= MAX_DEPTH
+        assert all(deep_thread[t["tweet_id"]] == t["depth"] for t in page["tweets"])
+    # The recursive thread query and the quoted tweets, however large the thread
+    assert counts == {10: 2, MAX_REPLIES: 2}
+
+def test_thread_page_escapes_tweet_text(deep_thread):
+    with count_statements(engine) as statements:
+        status, body, _ = get(app, f"/thread/{FOCUS}?limit=50")
+    assert status == 200
+    assert len(statements) == 2
+    assert b"<script>alert(1)</script>" not in body
+    assert b"&lt;script&gt;alert(1)&lt;/script&gt;<br>second line" in body
+
+def test_unknown_thread_is_404():
+    status, _, _ = get(app, "/thread/1.json")
+    assert status == 404